@@ -0,0 +1,40 @@
+# assets.py
+# Shared sprite images for the game windows. Each image is loaded, converted
+# and scaled once per size and the surface is shared by every sprite that uses
+# it, so creating another player costs a dict lookup instead of a file read and
+# a scale. Sprites must not draw on the shared surfaces.
+import os
+import pygame
+
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class AssetCache:
+    def __init__(self, directory=ASSET_DIR):
+        self.directory = directory
+        self.images = {}
+        self.masks = {}
+
+    def image(self, name, size=None):
+        # The display has to be set up first, for convert_alpha
+        key = (name, size)
+        image = self.images.get(key)
+        if image is None:
+            image = pygame.image.load(os.path.join(self.directory, name)).convert_alpha()
+            if size is not None:
+                image = pygame.transform.scale(image, size)
+            self.images[key] = image
+        return image
+
+    def mask(self, name, size=None):
+        # Collision mask of the image, for pygame.sprite.collide_mask
+        key = (name, size)
+        mask = self.masks.get(key)
+        if mask is None:
+            mask = pygame.mask.from_surface(self.image(name, size))
+            self.masks[key] = mask
+        return mask
+
+    def clear(self):
+        self.images.clear()
+        self.masks.clear()
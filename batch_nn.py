@@ -0,0 +1,171 @@
+# batch_nn.py
+# Evaluates the feed-forward networks of a whole population in one call per
+# frame. Each genome's node evals are laid out in padded arrays, so node k of
+# every network is computed together as a handful of NumPy operations.
+import math
+import numpy as np
+
+JUMP_THRESHOLD = 0.5
+# np.tanh and math.tanh can differ in the last bit, so outputs this close to
+# the threshold are re-checked with the original FeedForwardNetwork
+THRESHOLD_MARGIN = 1e-9
+# Below this many agents the per-call NumPy overhead costs more than just
+# running the FeedForwardNetworks one by one
+MIN_BATCH_SIZE = 16
+
+
+class PopulationNetwork:
+    def __init__(self, networks, num_inputs, sources, weights, biases, responses, outputs, num_steps=None):
+        # networks: one FeedForwardNetwork per agent, or anything that acts
+        # like a list of them, for small batches and close calls
+        self.networks = networks
+        self.num_inputs = num_inputs
+        # sources/weights: (agents, steps, links), biases/responses: (agents, steps),
+        # outputs: (agents, num_outputs) columns into the value buffer
+        self.sources = sources
+        self.weights = weights
+        self.biases = biases
+        self.responses = responses
+        self.outputs = outputs
+        if num_steps is None:
+            num_steps = np.array([len(net.node_evals) for net in networks], dtype=np.int64)
+        self.num_steps = num_steps
+        self.num_columns = num_inputs + 1 + biases.shape[1]
+
+    def __len__(self):
+        return len(self.networks)
+
+    @staticmethod
+    def create(genomes, config):
+        # Build the FeedForwardNetwork of each genome first so the layer order
+        # and the order of links inside each node match neat exactly. neat is
+        # only loaded here: workers fed from shared memory never need it.
+        import neat
+        networks = [neat.nn.FeedForwardNetwork.create(genome, config) for genome in genomes]
+        genome_config = config.genome_config
+        for genome in genomes:
+            for node in genome.nodes.values():
+                if node.activation != 'tanh' or node.aggregation != 'sum':
+                    raise ValueError("PopulationNetwork only supports tanh/sum nodes, got {0}/{1}".format(node.activation, node.aggregation))
+
+        num_inputs = len(genome_config.input_keys)
+        zero_column = num_inputs
+        num_steps = max([len(net.node_evals) for net in networks] + [1])
+        num_links = max([len(links) for net in networks for *_, links in net.node_evals] + [1])
+
+        sources = np.full((len(networks), num_steps, num_links), zero_column, dtype=np.int64)
+        weights = np.zeros((len(networks), num_steps, num_links))
+        biases = np.zeros((len(networks), num_steps))
+        responses = np.zeros((len(networks), num_steps))
+        outputs = np.full((len(networks), len(genome_config.output_keys)), zero_column, dtype=np.int64)
+
+        for i, net in enumerate(networks):
+            columns = dict((key, k) for k, key in enumerate(net.input_nodes))
+            for k, (node, act_func, agg_func, bias, response, links) in enumerate(net.node_evals):
+                for l, (source, weight) in enumerate(links):
+                    sources[i, k, l] = columns[source]
+                    weights[i, k, l] = weight
+                biases[i, k] = bias
+                responses[i, k] = response
+                columns[node] = num_inputs + 1 + k
+            for j, key in enumerate(net.output_nodes):
+                # Output nodes without connections are never evaluated and stay 0.0
+                outputs[i, j] = columns.get(key, zero_column)
+
+        return PopulationNetwork(networks, num_inputs, sources, weights, biases, responses, outputs)
+
+    @staticmethod
+    def from_arrays(num_inputs, sources, weights, biases, responses, outputs, num_steps):
+        # Wraps arrays laid out by create() (e.g. views of shared memory), with
+        # no genomes or FeedForwardNetworks around
+        network = PopulationNetwork(None, num_inputs, sources, weights, biases, responses, outputs, num_steps)
+        network.networks = RowNetworks(network)
+        return network
+
+    def activate(self, inputs, agents=None):
+        # agents can repeat or reorder networks (fast_forward asks each one
+        # about several frames); only all of them in order skips the gather
+        everyone = agents is None
+        if everyone:
+            agents = np.arange(len(self.networks))
+        else:
+            agents = np.asarray(agents)
+            everyone = len(agents) == len(self.networks) and np.array_equal(agents, np.arange(len(self.networks)))
+        inputs = np.asarray(inputs, dtype=np.float64)
+        if inputs.shape != (len(agents), self.num_inputs):
+            raise RuntimeError("Expected inputs of shape {0}, got {1}".format((len(agents), self.num_inputs), inputs.shape))
+
+        values = np.zeros((len(agents), self.num_columns))
+        values[:, :self.num_inputs] = inputs
+        if everyone:
+            sources, weights, biases, responses = self.sources, self.weights, self.biases, self.responses
+        else:
+            sources = self.sources[agents]
+            weights = self.weights[agents]
+            biases = self.biases[agents]
+            responses = self.responses[agents]
+
+        # Steps past the longest network in this batch are all padding
+        for k in range(self.num_steps[agents].max(initial=0)):
+            products = np.take_along_axis(values, sources[:, k], axis=1) * weights[:, k]
+            # Add the links one at a time in the same order as sum() in neat
+            s = np.zeros(len(agents))
+            for l in range(products.shape[1]):
+                s += products[:, l]
+            z = np.clip(2.5 * (biases[:, k] + responses[:, k] * s), -60.0, 60.0)
+            values[:, self.num_inputs + 1 + k] = np.tanh(z)
+
+        return np.take_along_axis(values, self.outputs[agents], axis=1)
+
+    def jump_mask(self, inputs, agents=None):
+        if agents is None:
+            agents = np.arange(len(self.networks))
+        inputs = np.asarray(inputs, dtype=np.float64)
+        if len(agents) < MIN_BATCH_SIZE:
+            return np.array([self.networks[i].activate(row)[0] > JUMP_THRESHOLD for i, row in zip(agents.tolist(), inputs.tolist())], dtype=bool)
+        output = self.activate(inputs, agents)[:, 0]
+        jumps = output > JUMP_THRESHOLD
+        for j in np.flatnonzero(np.abs(output - JUMP_THRESHOLD) < THRESHOLD_MARGIN):
+            jumps[j] = self.networks[agents[j]].activate(list(inputs[j]))[0] > JUMP_THRESHOLD
+        return jumps
+
+
+class RowNetwork:
+    # One agent of a PopulationNetwork on its own, computed with Python floats
+    # like FeedForwardNetwork does, so it gives exactly neat's outputs
+    def __init__(self, network, agent):
+        self.num_inputs = network.num_inputs
+        self.values = [0.0] * network.num_columns
+        zero_column = network.num_inputs
+        self.node_evals = []
+        for k in range(network.num_steps[agent]):
+            # Padding links read the zero column with weight 0, so leave them out
+            links = [(source, weight) for source, weight in zip(network.sources[agent, k].tolist(), network.weights[agent, k].tolist())
+                     if source != zero_column or weight != 0.0]
+            self.node_evals.append((network.num_inputs + 1 + k, float(network.biases[agent, k]), float(network.responses[agent, k]), links))
+        self.outputs = network.outputs[agent].tolist()
+
+    def activate(self, inputs):
+        values = self.values
+        values[:self.num_inputs] = inputs
+        for column, bias, response, links in self.node_evals:
+            z = bias + response * sum([values[i] * w for i, w in links])
+            values[column] = math.tanh(max(-60.0, min(60.0, 2.5 * z)))
+        return [values[i] for i in self.outputs]
+
+
+class RowNetworks:
+    # networks for PopulationNetwork.from_arrays; an agent's RowNetwork is only
+    # built the first time it's needed
+    def __init__(self, network):
+        self.network = network
+        self.rows = {}
+
+    def __len__(self):
+        return len(self.network.biases)
+
+    def __getitem__(self, agent):
+        row = self.rows.get(agent)
+        if row is None:
+            row = self.rows[agent] = RowNetwork(self.network, agent)
+        return row
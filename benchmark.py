@@ -0,0 +1,255 @@
+# benchmark.py
+# Headless performance benchmarks. Everything runs on fixed seeds, so two runs
+# on different commits measure the same work:
+#   python benchmark.py --output before.json
+#   python benchmark.py --output after.json --compare before.json
+import os
+import sys
+import json
+import time
+import random
+import pickle
+import argparse
+import platform
+import subprocess
+import numpy as np
+import neat
+from simulation import HeadlessGame, Course
+from population import run_population
+from fast_forward import run_fast_forward
+from batch_nn import PopulationNetwork
+from neat_dino import eval_genomes
+from parallel import ShardedEvaluator
+from shared_eval import SharedEvaluator
+
+POPULATION_SIZES = [1, 100, 1000, 10000]
+MUTATIONS = 10  # Mutate the fresh genomes a few times so they have some hidden nodes
+MIN_TIME = 1.0  # Keep repeating a benchmark until it has run at least this long
+# Entry points and worker modules whose import time matters, each timed in a fresh interpreter
+IMPORT_MODULES = ["simulation", "population", "fast_forward", "netformat", "parallel", "game", "neat_dino"]
+IMPORT_REPEATS = 5
+# Transport benchmarks play short episodes, so moving the networks is a visible part of the time
+TRANSPORT_FRAMES = 300
+IMPORT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import {0}
+print(time.perf_counter() - start, 'pygame.display' in sys.modules and sys.modules['pygame'].display.get_init(),
+      'pygame' in sys.modules, 'neat' in sys.modules)
+"""
+
+
+def load_config(config_path, pop_size=None):
+    config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                         neat.DefaultSpeciesSet, neat.DefaultStagnation,
+                         config_path)
+    if pop_size is not None:
+        config.pop_size = pop_size
+    return config
+
+
+def make_genomes(config, count, seed):
+    random.seed(seed)
+    genomes = []
+    for key in range(count):
+        genome = config.genome_type(key)
+        genome.configure_new(config.genome_config)
+        for _ in range(MUTATIONS):
+            genome.mutate(config.genome_config)
+        genomes.append(genome)
+    return genomes
+
+
+def repeat(run, min_time):
+    # Calls run(i) with i = 0, 1, 2... until min_time has passed; run returns the amount of work done
+    work = 0
+    i = 0
+    start = time.perf_counter()
+    while True:
+        work += run(i)
+        i += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return work, elapsed, i
+
+
+def bench_single_agent(config, seed, min_time):
+    genome = make_genomes(config, 1, seed)[0]
+    net = neat.nn.FeedForwardNetwork.create(genome, config)
+
+    def run(i):
+        game = HeadlessGame(1, Course(seed + i))
+        while not game.game_over:
+            game.step([net])
+        return game.score
+
+    frames, elapsed, episodes = repeat(run, min_time)
+    return {"name": "single_agent", "frames": frames, "episodes": episodes, "seconds": elapsed,
+            "frames_per_sec": frames / elapsed}
+
+
+def bench_population(config, genomes, size, engine, seed, min_time):
+    network = PopulationNetwork.create(genomes[:size], config)
+    run_engine = run_fast_forward if engine == "fast_forward" else run_population
+
+    def run(i):
+        # Every alive agent takes one step per frame, so the scores add up to the agent-steps
+        return sum(run_engine(network, Course(seed + i)))
+
+    steps, elapsed, episodes = repeat(run, min_time)
+    return {"name": "population_{0}_{1}".format(engine, size), "agents": size, "agent_steps": steps,
+            "episodes": episodes, "seconds": elapsed, "agent_steps_per_sec": steps / elapsed}
+
+
+def bench_activations(config, genomes, size, seed, min_time):
+    rng = np.random.default_rng(seed)
+    inputs = np.empty((size, 7))
+    inputs[:, 0:3] = np.sort(rng.integers(-20, 700, (size, 3)), axis=1)
+    inputs[:, 3:6] = rng.integers(20, 101, (size, 3))
+    inputs[:, 6] = rng.integers(0, 2, size)
+
+    network = PopulationNetwork.create(genomes[:size], config)
+    activations, elapsed, calls = repeat(lambda i: len(network.jump_mask(inputs)), min_time)
+    batched = {"name": "activations_batched_{0}".format(size), "agents": size, "activations": activations,
+               "seconds": elapsed, "activations_per_sec": activations / elapsed}
+
+    rows = inputs.tolist()
+    activations, elapsed, calls = repeat(lambda i: len([net.activate(row) for net, row in zip(network.networks, rows)]), min_time)
+    single = {"name": "activations_feedforward_{0}".format(size), "agents": size, "activations": activations,
+              "seconds": elapsed, "activations_per_sec": activations / elapsed}
+    return [batched, single]
+
+
+def bench_generations(config_path, pop_size, generations, seed):
+    config = load_config(config_path, pop_size)
+    random.seed(seed)
+    pop = neat.Population(config)
+    course = Course(seed)
+    times = []
+
+    def timed_eval(genomes, config):
+        start = time.perf_counter()
+        eval_genomes(genomes, config, course)
+        times.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    pop.run(timed_eval, generations)
+    elapsed = time.perf_counter() - start
+    return {"name": "neat_generation_{0}".format(pop_size), "pop_size": pop_size, "generations": len(times),
+            "seconds": elapsed, "seconds_per_generation": elapsed / len(times),
+            "eval_seconds_per_generation": sum(times) / len(times)}
+
+
+def bench_transport(config, genomes, sizes, workers, seed, min_time):
+    # One generation's evaluation across a process pool, with the genomes
+    # pickled to the workers or the compiled networks in shared memory
+    results = []
+    for name, evaluator_type in (("pickle", ShardedEvaluator), ("shared", SharedEvaluator)):
+        with evaluator_type(workers) as evaluator:
+            for size in sizes:
+                shard = genomes[:size]
+                evaluator.run_shards(shard, config, seed, TRANSPORT_FRAMES)
+                work, elapsed, generations = repeat(lambda i: len(evaluator.run_shards(shard, config, seed + i, TRANSPORT_FRAMES)), min_time)
+                result = {"name": "transport_{0}_{1}".format(name, size), "agents": size, "workers": workers,
+                          "seconds": elapsed, "seconds_per_generation": elapsed / generations}
+                if name == "pickle":
+                    result["bytes_sent"] = len(pickle.dumps((shard, config), protocol=pickle.HIGHEST_PROTOCOL))
+                else:
+                    result["bytes_shared"] = evaluator.arena.block_size()
+                results.append(result)
+    return results
+
+
+def bench_imports(modules, repeats):
+    local_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="1", SDL_VIDEODRIVER=os.environ.get("SDL_VIDEODRIVER", "dummy"))
+    results = []
+    for module in modules:
+        times = []
+        for _ in range(repeats):
+            output = subprocess.check_output([sys.executable, "-c", IMPORT_SCRIPT.format(module)], cwd=local_dir, env=env)
+            seconds, display, pygame, neat = output.decode().split()
+            times.append(float(seconds))
+        # The fastest run is the one least disturbed by the rest of the machine
+        results.append({"name": "import_{0}".format(module), "import_ms": 1000 * min(times),
+                        "opens_display": display == "True", "loads_pygame": pygame == "True", "loads_neat": neat == "True"})
+    return results
+
+
+def is_rate(key):
+    return key.endswith("_per_sec")
+
+
+def is_time(key):
+    return key.endswith("per_generation") or key.endswith("_ms")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(config_path, sizes, seed, min_time, generations, workers):
+    config = load_config(config_path)
+    genomes = make_genomes(config, max(sizes), seed)
+    results = bench_imports(IMPORT_MODULES, IMPORT_REPEATS)
+    results.append(bench_single_agent(config, seed, min_time))
+    for size in sizes:
+        for engine in ("step", "fast_forward"):
+            results.append(bench_population(config, genomes, size, engine, seed, min_time))
+        results.extend(bench_activations(config, genomes, size, seed, min_time))
+    results.extend(bench_transport(config, genomes, sizes, workers, seed, min_time))
+    results.append(bench_generations(config_path, config.pop_size, generations, seed))
+    return results
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = dict((result["name"], result) for result in json.load(f)["results"])
+    for result in results:
+        old = baseline.get(result["name"])
+        if old is None:
+            continue
+        for key, value in result.items():
+            if (is_rate(key) or is_time(key)) and key in old:
+                # Higher is better for rates, lower is better for times
+                ratio = value / old[key] if is_rate(key) else old[key] / value
+                print("{0:40s} {1:28s} {2:12.4g} -> {3:12.4g}  x{4:.2f}".format(result["name"], key, old[key], value, ratio))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', default=None, help='earlier results file to compare against')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--sizes', type=int, nargs='+', default=POPULATION_SIZES)
+    parser.add_argument('--min-time', type=float, default=MIN_TIME)
+    parser.add_argument('--generations', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=2, help='process pool size for the transport benchmarks')
+    args = parser.parse_args()
+
+    local_dir = os.path.dirname(os.path.abspath(__file__))
+    config_path = os.path.join(local_dir, 'config-feedforward.txt')
+    results = run_benchmarks(config_path, args.sizes, args.seed, args.min_time, args.generations, args.workers)
+
+    report = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": args.seed,
+        "results": results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for result in results:
+        rates = ", ".join("{0}={1:.4g}".format(k, v) for k, v in result.items() if is_rate(k) or is_time(k))
+        print("{0:40s} {1}".format(result["name"], rates))
+    if args.compare:
+        compare(results, args.compare)
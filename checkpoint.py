@@ -0,0 +1,125 @@
+# checkpoint.py
+# Periodic checkpoints for long training runs, and resuming from the latest one.
+# The population is pickled in the training thread (so the snapshot is
+# consistent), then compressed and written by a background thread into a temp
+# file that is renamed into place, so a crash never leaves half a checkpoint.
+import os
+import re
+import gzip
+import random
+import pickle
+import tempfile
+import threading
+from itertools import count
+import neat
+
+CHECKPOINT_PREFIX = 'neat-checkpoint-'
+CHECKPOINT_SUFFIX = '.pkl.gz'
+
+
+class Checkpointer(neat.reporting.BaseReporter):
+    def __init__(self, directory='checkpoints', interval=1, keep=3, compresslevel=1):
+        if keep < 1:
+            raise ValueError("keep must be at least 1, got {0}".format(keep))
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+        self.compresslevel = compresslevel
+        self.generation = None
+        self.best_genome = None
+        self.writer = None
+        os.makedirs(directory, exist_ok=True)
+
+    def __getstate__(self):
+        # Reporters can end up inside pickles; the writer thread can't
+        state = self.__dict__.copy()
+        state['writer'] = None
+        return state
+
+    def start_generation(self, generation):
+        self.generation = generation
+
+    def post_evaluate(self, config, population, species, best_genome):
+        if self.best_genome is None or best_genome.fitness > self.best_genome.fitness:
+            self.best_genome = best_genome
+
+    def end_generation(self, config, population, species_set):
+        # Population.run counts the generation up after this, so the saved
+        # population is the one generation + 1 will evaluate
+        if (self.generation + 1) % self.interval == 0:
+            self.save(population, species_set, self.generation + 1)
+
+    def save(self, population, species_set, generation):
+        # The reporters hang off the species set but belong to the running
+        # process (and StatisticsReporter grows every generation), so leave them
+        # out. The species counter is stored as a number, not an itertools.count.
+        reporters, indexer = species_set.reporters, species_set.indexer
+        next_species_id = next(indexer)
+        species_set.reporters = species_set.indexer = None
+        try:
+            data = pickle.dumps((generation, population, species_set, next_species_id, random.getstate(), self.best_genome),
+                                protocol=pickle.HIGHEST_PROTOCOL)
+        finally:
+            species_set.reporters = reporters
+            species_set.indexer = count(next_species_id)
+
+        self.wait()
+        self.writer = threading.Thread(target=self.write, args=(data, generation))
+        self.writer.start()
+
+    def write(self, data, generation):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=self.compresslevel) as gz:
+                    gz.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, checkpoint_path(self.directory, generation))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        for old_generation, old_path in list_checkpoints(self.directory)[:-self.keep]:
+            os.remove(old_path)
+
+    def wait(self):
+        if self.writer is not None:
+            self.writer.join()
+            self.writer = None
+
+
+def checkpoint_path(directory, generation):
+    return os.path.join(directory, '{0}{1}{2}'.format(CHECKPOINT_PREFIX, generation, CHECKPOINT_SUFFIX))
+
+
+def list_checkpoints(directory):
+    # (generation, path) pairs, oldest first
+    pattern = re.compile(re.escape(CHECKPOINT_PREFIX) + r'(\d+)' + re.escape(CHECKPOINT_SUFFIX) + '$')
+    found = []
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            match = pattern.match(name)
+            if match:
+                found.append((int(match.group(1)), os.path.join(directory, name)))
+    return sorted(found)
+
+
+def latest_checkpoint(directory):
+    found = list_checkpoints(directory)
+    return found[-1][1] if found else None
+
+
+def restore_checkpoint(path, config):
+    with gzip.open(path, 'rb') as f:
+        generation, population, species_set, next_species_id, rndstate, best_genome = pickle.load(f)
+    random.setstate(rndstate)
+    species_set.indexer = count(next_species_id)
+
+    pop = neat.Population(config, (population, species_set, generation))
+    species_set.reporters = pop.reporters
+    pop.best_genome = best_genome
+    # New genome and node keys have to carry on from the restored population
+    pop.reproduction.genome_indexer = count(max(population) + 1)
+    config.genome_config.node_indexer = count(max(max(genome.nodes) for genome in population.values()) + 1)
+    return pop
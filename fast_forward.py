@@ -0,0 +1,191 @@
+# fast_forward.py
+# Event-driven version of population.run_population. Agents never interact and
+# every course is known in advance, so instead of stepping frame by frame each
+# agent jumps straight between the frames that matter:
+#   - on the ground it runs until the first frame an obstacle reaches it, and
+#     the network only has to be asked about the frames before that;
+#   - after a jump the whole flight is fixed, so the only question is whether it
+#     clips an obstacle on the way, and the network is not needed at all
+#     (a jump in mid-air does nothing).
+# The scores are exactly the ones frame stepping gives.
+import numpy as np
+from simulation import WINDOW_HEIGHT, PLAYER_X, PLAYER_SIZE, GROUND_Y, OBSTACLE_SPEED, OBSTACLE_WIDTH
+from simulation import MAX_SCORE_THRESHOLD
+from simulation import Agent, Course
+from population import NUM_INPUTS, jump_mask
+from profiling import NULL_PROFILER
+
+# How many ground frames of each agent go into one batched network call
+WINDOW = 64
+
+
+def flight_path():
+    # y after each frame of a jump, from the same Agent physics as the frame loop,
+    # up to (not including) the frame the agent is back on the ground
+    agent = Agent()
+    agent.jump()
+    path = []
+    while True:
+        agent.update()
+        if agent.y == GROUND_Y:
+            return path
+        path.append(agent.y)
+
+
+FLIGHT_Y = np.array(flight_path(), dtype=np.int64)
+FLIGHT_FRAMES = len(FLIGHT_Y) + 1
+
+
+class CourseTable:
+    def __init__(self, course, frames):
+        course.prefill(frames)
+        self.x = np.array(course.x, dtype=np.int64)
+        self.width = np.array(course.width, dtype=np.int64)
+        self.height = np.array(course.height, dtype=np.int64)
+        # Frames on which obstacle i overlaps the player's column, and the frame
+        # it is replaced by obstacle i + 3
+        self.first_hit = (self.x - PLAYER_X - PLAYER_SIZE) // OBSTACLE_SPEED + 1
+        self.last_hit = (self.x + self.width - PLAYER_X - 1) // OBSTACLE_SPEED
+        self.leave = -(-(self.x + OBSTACLE_WIDTH) // OBSTACLE_SPEED)
+
+    def ground_hit(self, frames):
+        # First frame at or after each given frame on which a grounded agent is hit
+        upcoming = np.searchsorted(self.last_hit, frames)
+        return np.maximum(self.first_hit[upcoming], frames)
+
+    def flight_hit(self, jump_frames):
+        # First frame of the flight that starts after each jump frame on which
+        # the agent hits an obstacle, or 0 if it clears them all
+        frames = jump_frames[:, None] + np.arange(1, FLIGHT_FRAMES)
+        hit = np.zeros(frames.shape, dtype=bool)
+        upcoming = np.searchsorted(self.last_hit, jump_frames + 1)
+        # A flight is shorter than the gap between obstacles i and i + 2
+        for i in (upcoming, upcoming + 1):
+            in_column = (frames >= self.first_hit[i][:, None]) & (frames <= self.last_hit[i][:, None])
+            top = WINDOW_HEIGHT - self.height[i][:, None]
+            hit |= in_column & (FLIGHT_Y < top + self.height[i][:, None]) & (top < FLIGHT_Y + PLAYER_SIZE)
+        return np.where(hit.any(axis=1), frames[np.arange(len(frames)), hit.argmax(axis=1)], 0)
+
+    def inputs(self, frames):
+        # Network inputs of a grounded agent on each frame, after obstacle replacement
+        first = np.searchsorted(self.leave, frames, side="right")
+        visible = first[:, None] + np.arange(3)
+        inputs = np.empty((len(frames), NUM_INPUTS))
+        inputs[:, 0:3] = self.x[visible] - OBSTACLE_SPEED * frames[:, None] - PLAYER_X - PLAYER_SIZE
+        inputs[:, 3:6] = self.height[visible]
+        inputs[:, 6] = 1
+        return inputs
+
+
+def run_fast_forward(neural_networks, course=None, max_score=MAX_SCORE_THRESHOLD, window=WINDOW, profiler=NULL_PROFILER):
+    if course is None:
+        course = Course()
+    table = CourseTable(course, max_score + window + FLIGHT_FRAMES)
+    final_frame = max_score + 1
+    scores = np.full(len(neural_networks), final_frame, dtype=np.int64)
+
+    # Every agent in play is on the ground and the collision check of frame t is next
+    agents = np.arange(len(neural_networks))
+    t = np.ones(len(agents), dtype=np.int64)
+    while len(agents):
+        profiler.count("rounds")
+        start = profiler.clock()
+        death = table.ground_hit(t)
+        end = np.minimum(np.minimum(death, t + window), final_frame)
+        done = end <= t
+        profiler.count("collisions", int((done & (end == death) & (end <= max_score)).sum()))
+        scores[agents[done]] = end[done]
+        agents, t, death, end = agents[~done], t[~done], death[~done], end[~done]
+        if not len(agents):
+            break
+
+        # One network call for the next few ground frames of every agent
+        lengths = end - t
+        starts = np.cumsum(lengths) - lengths
+        frames = np.arange(lengths.sum()) + np.repeat(t - starts, lengths)
+        start = profiler.add_time("events", start)
+        inputs = table.inputs(frames)
+        start = profiler.add_time("inputs", start)
+        jumps = jump_mask(neural_networks, inputs, np.repeat(agents, lengths))
+        start = profiler.add_time("activate", start)
+        profiler.count("activations", len(frames))
+        jump_frame = np.minimum.reduceat(np.where(jumps, frames, final_frame + 1), starts)
+        jumped = jump_frame <= final_frame
+
+        hit = np.zeros(len(agents), dtype=np.int64)
+        hit[jumped] = table.flight_hit(jump_frame[jumped])
+        crashed = jumped & (hit > 0)
+        profiler.count("collisions", int(crashed.sum()))
+        scores[agents[crashed]] = np.minimum(hit[crashed], final_frame)
+        landed = jumped & (hit == 0)
+        t[landed] = jump_frame[landed] + FLIGHT_FRAMES
+
+        # Agents that never jumped either run into the obstacle or just keep going
+        walked = ~jumped
+        t[walked] = end[walked]
+        keep = landed | walked
+        agents, t = agents[keep], t[keep]
+        profiler.add_time("events", start)
+
+    return scores.tolist()
+
+
+if __name__ == '__main__':
+    # Regression check: fast-forwarding has to give exactly the scores of frame
+    # stepping, for any population size and batching window. Small windows make
+    # batches that repeat agents yet have exactly one row per network, which the
+    # batched networks must not mistake for one row of each in order.
+    import os
+    import random
+    import argparse
+    import neat
+    from population import run_population
+    from batch_nn import PopulationNetwork
+
+    parser = argparse.ArgumentParser(description='Compare run_fast_forward with run_population on seeded courses')
+    parser.add_argument('--seeds', type=int, default=40, help='courses per population size')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 16, 32, 64, 100])
+    parser.add_argument('--windows', type=int, nargs='+', default=[1, 2, 3, 5, 8, WINDOW])
+    parser.add_argument('--mutations', type=int, default=10)
+    parser.add_argument('--config', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config-feedforward.txt'))
+    args = parser.parse_args()
+
+    config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                         neat.DefaultSpeciesSet, neat.DefaultStagnation,
+                         args.config)
+    mismatches = 0
+    checks = 0
+    for size in args.sizes:
+        for seed in range(args.seeds):
+            random.seed(seed)
+            genomes = []
+            for key in range(size):
+                genome = config.genome_type(key)
+                genome.configure_new(config.genome_config)
+                for _ in range(args.mutations):
+                    genome.mutate(config.genome_config)
+                genomes.append(genome)
+            network = PopulationNetwork.create(genomes, config)
+            expected = run_population(network, Course(seed))
+
+            # The same kind of batch directly: size rows, agents repeated
+            rng = np.random.RandomState(seed)
+            agents = np.sort(rng.randint(0, size, size))
+            inputs = rng.uniform(-OBSTACLE_WIDTH, 700, (size, NUM_INPUTS))
+            inputs[:, NUM_INPUTS - 1] = rng.randint(0, 2, size)
+            checks += 1
+            direct = [network.networks[i].activate(row)[0] > 0.5 for i, row in zip(agents.tolist(), inputs.tolist())]
+            if jump_mask(network, inputs, agents).tolist() != direct:
+                mismatches += 1
+                print("Mismatch: {0} agents, seed {1}: batched decisions for repeated agents".format(size, seed))
+            for window in args.windows:
+                checks += 1
+                scores = run_fast_forward(network, Course(seed), window=window)
+                if scores != expected:
+                    mismatches += 1
+                    agent = next(i for i in range(size) if scores[i] != expected[i])
+                    print("Mismatch: {0} agents, seed {1}, window {2}: agent {3} scored {4} instead of {5}".format(
+                        size, seed, window, agent, scores[agent], expected[agent]))
+    print("{0} of {1} checks differ".format(mismatches, checks))
+    if mismatches:
+        raise SystemExit(1)
@@ -0,0 +1,62 @@
+# fitness_cache.py
+# Remembers the fitness of genomes whose networks have already played a course.
+# Elites carry over unchanged between generations, and on a fixed course seed
+# the game is deterministic, so their score can't change. A genome is keyed by
+# everything that decides what its network does: the nodes (bias, response,
+# activation, aggregation) and the enabled connections with their weights.
+import hashlib
+from collections import OrderedDict
+from simulation import MAX_SCORE_THRESHOLD
+
+DEFAULT_CACHE_SIZE = 1024
+
+
+def genome_hash(genome):
+    nodes = sorted((key, node.bias, node.response, node.activation, node.aggregation)
+                   for key, node in genome.nodes.items())
+    connections = sorted((key, connection.weight)
+                         for key, connection in genome.connections.items() if connection.enabled)
+    # repr of a float is exact, so equal digests mean equal networks
+    return hashlib.blake2b(repr((nodes, connections)).encode(), digest_size=16).digest()
+
+
+class FitnessCache:
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        # (genome hash, course seed, max score) -> fitness, least recently used first
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, genomes, seed, max_score=MAX_SCORE_THRESHOLD):
+        # Sets the fitness of every genome already in the cache and returns the
+        # (genome_id, genome) pairs that still have to be played, with their keys
+        pending = []
+        for genome_id, genome in genomes:
+            key = (genome_hash(genome), seed, max_score)
+            fitness = self.entries.get(key)
+            if fitness is None:
+                pending.append((genome_id, genome, key))
+            else:
+                self.entries.move_to_end(key)
+                genome.fitness = fitness
+        self.hits += len(genomes) - len(pending)
+        self.misses += len(pending)
+        return pending
+
+    def store(self, key, fitness):
+        self.entries[key] = fitness
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.entries.clear()
+        self.reset_stats()
@@ -1,28 +1,47 @@
 # game.py
 import pygame
 import sys
-import random
 import os
-import pickle
-import itertools
-import neat
+import time
+from simulation import WINDOW_WIDTH, WINDOW_HEIGHT, PLAYER_SIZE, OBSTACLE_WIDTH, OBSTACLE_HEIGHT, MAX_SCORE_THRESHOLD
+from simulation import Course
+from text_render import TextRenderer, HudField
+from profiling import NULL_PROFILER
+from netformat import CompactNetwork
 
-WINDOW_WIDTH = 800
-WINDOW_HEIGHT = 300
 FPS = 60
+# Game speed, as a multiple of FPS ticks per second; 0 runs as fast as possible.
+# It is picked with the number keys while agents play and carries over to the
+# next game_loop, e.g. the next generation
+SPEED_KEYS = {pygame.K_1: 1, pygame.K_2: 10, pygame.K_3: 100, pygame.K_4: 0}
+game_speed = 1
+FAST_SPEED = 100  # From this speed on (and at 0) frames are only drawn SLOW_RENDER_FPS times a second
+SLOW_RENDER_FPS = 15
+MAX_FRAME_TIME = 0.25  # A longer stall doesn't make the game try to catch up
 
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 
-PLAYER_SIZE = 30
-OBSTACLE_WIDTH = 20
-OBSTACLE_HEIGHT = 50
-MAX_SCORE_THRESHOLD = 12000  # Adjust this value as needed
-
-pygame.init()
-screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
-pygame.display.set_caption("Dinosaur Game")
-clock = pygame.time.Clock()
+# The window is opened by the first game_loop, not on import, so importing this
+# module for its sprites or helpers doesn't pop up a window
+screen = None
+background = None
+clock = None
+text_renderer = TextRenderer()
+score_field = HudField(text_renderer, "Score: {}", 24)
+speed_field = HudField(text_renderer, "Speed: {}", 24)
+node_fields = []
+
+def init_display():
+    global screen, background, clock
+    if screen is None:
+        pygame.init()
+        screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+        pygame.display.set_caption("Dinosaur Game")
+        background = pygame.Surface(screen.get_size())
+        background.fill(WHITE)
+        clock = pygame.time.Clock()
+    return screen
 
 class Player(pygame.sprite.Sprite):
     def __init__(self, x, y, color):
@@ -47,30 +66,50 @@ class Player(pygame.sprite.Sprite):
         if self.rect.y == WINDOW_HEIGHT - PLAYER_SIZE:
             self.y_velocity = -18
 
+    def reset(self):
+        self.score = 0
+        self.alive = True
+        self.rect.y = WINDOW_HEIGHT - PLAYER_SIZE
+        self.y_velocity = 0
+
 def draw_nodes(inputs, output, x, y, node_radius=10):
+    # Returns the area drawn on
     num_inputs = len(inputs)
     input_spacing = 30
     output_spacing = 30
+    drawn = []
+
+    # One cached label per node, the last one is the output
+    while len(node_fields) < num_inputs + 1:
+        node_fields.append(HudField(text_renderer, "{:.2f}", 16))
 
     # Draw input nodes
     for i, input_value in enumerate(inputs):
         input_y = y + i * input_spacing
-        pygame.draw.circle(screen, BLACK, (x, input_y), node_radius)
-        draw_text(f"{input_value:.2f}", 16, x + 2 * node_radius, input_y - node_radius // 2)
+        drawn.append(pygame.draw.circle(screen, BLACK, (x, input_y), node_radius))
+        drawn.append(node_fields[i].draw(screen, input_value, x + 2 * node_radius, input_y - node_radius // 2))
 
     # Draw output node
     output_y = y + (num_inputs - 1) * input_spacing // 2
-    pygame.draw.circle(screen, BLACK, (x + 100, output_y), node_radius)
-    draw_text(f"{output[0]:.2f}", 16, x + 100 + 2 * node_radius, output_y - node_radius // 2)
+    drawn.append(pygame.draw.circle(screen, BLACK, (x + 100, output_y), node_radius))
+    drawn.append(node_fields[num_inputs].draw(screen, output[0], x + 100 + 2 * node_radius, output_y - node_radius // 2))
 
     # Draw connections
     for i in range(num_inputs):
         input_y = y + i * input_spacing
-        pygame.draw.line(screen, BLACK, (x + node_radius, input_y), (x + 100 - node_radius, output_y), 2)
+        drawn.append(pygame.draw.line(screen, BLACK, (x + node_radius, input_y), (x + 100 - node_radius, output_y), 2))
 
+    return drawn[0].unionall(drawn[1:])
 
-def load_winner(config_path):
-    with open('winner.pkl', 'rb') as f:
+
+def load_winner(config_path, net_path='winner.net', genome_path='winner.pkl'):
+    # The compact network loads without neat; the pickled genome is the fallback
+    if os.path.exists(net_path):
+        return CompactNetwork.load(net_path)
+
+    import pickle
+    import neat
+    with open(genome_path, 'rb') as f:
         genome = pickle.load(f)
 
     config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction,
@@ -81,11 +120,25 @@ def load_winner(config_path):
 
     return winner_net
 
+# Every obstacle image is a view into one black surface, so placing an obstacle
+# never allocates or fills pixels
+obstacle_sheet = None
+
+def obstacle_surface(width, height):
+    global obstacle_sheet
+    if obstacle_sheet is None or width > obstacle_sheet.get_width() or height > obstacle_sheet.get_height():
+        obstacle_sheet = pygame.Surface((max(width, 64), max(height, 128)))
+        obstacle_sheet.fill(BLACK)
+    return obstacle_sheet.subsurface((0, 0, width, height))
+
 class Obstacle(pygame.sprite.Sprite):
     def __init__(self, x, y, width, height):
         super().__init__()
-        self.image = pygame.Surface((width, height))
-        self.image.fill(BLACK)
+        self.place(x, y, width, height)
+
+    def place(self, x, y, width, height):
+        # Obstacle sprites are reused for the next obstacle of the course
+        self.image = obstacle_surface(width, height)
         self.rect = self.image.get_rect()
         self.rect.x = x
         self.rect.y = y
@@ -93,147 +146,240 @@ class Obstacle(pygame.sprite.Sprite):
     def update(self):
         self.rect.x -= 5
 
-def get_obstacle_info(player, obstacles):
+def get_obstacle_info(obstacles, first, player_x=50):
+    # obstacles is a ring buffer: a new obstacle always takes the slot of the one
+    # that left, so reading from the slot of the leftmost one is already in x order.
+    # Every agent stands at the same x, so this only has to run once per frame.
     obstacle_info = []
 
-    for obstacle in obstacles:
-        distance = obstacle.rect.x - player.rect.x - PLAYER_SIZE
+    for k in range(len(obstacles)):
+        obstacle = obstacles[(first + k) % len(obstacles)]
+        distance = obstacle.rect.x - player_x - PLAYER_SIZE
         width = obstacle.rect.width
         height = obstacle.rect.height
         obstacle_info.append((distance, width, height))
 
-    obstacle_info.sort(key=lambda x: x[0])
-
-    on_ground = player.rect.y == WINDOW_HEIGHT - PLAYER_SIZE
-
-    return obstacle_info[:3], on_ground
-
-def generate_obstacle(prev_x, min_separation):
-    x = prev_x + min_separation + random.randint(0, 100)
-    width = random.randint(20, 50)
-    height = random.randint(20, 100)
-    obstacle = Obstacle(x, WINDOW_HEIGHT - height, width, height)
-    return obstacle
+    return obstacle_info
 
 def draw_text(text, size, x, y):
-    font = pygame.font.Font(None, size)
-    text_surface = font.render(text, True, BLACK)
-    text_rect = text_surface.get_rect()
-    text_rect.topleft = (x, y)
-    screen.blit(text_surface, text_rect)
+    return text_renderer.draw(screen, text, size, x, y)
 
-def game_loop(human_playing, agents, neural_networks=None, current_best_score=0, auto_start=False, generation=0):
+def game_loop(human_playing, agents, neural_networks=None, current_best_score=0, auto_start=False, generation=0, course=None, profiler=NULL_PROFILER, draw_first=None, speed=None):
+    global game_speed
+    init_display()
+    if speed is not None:
+        game_speed = speed
     best_score = current_best_score
-    min_separation = 160
-    obstacles = [generate_obstacle(i * (min_separation + OBSTACLE_WIDTH), min_separation) for i in range(3)]
-    all_sprites = pygame.sprite.Group()
-
     players = agents if not human_playing else [Player(50, WINDOW_HEIGHT - PLAYER_SIZE, BLACK)]
-    alive_agents = len(players)
-
-    for player in players:
-        all_sprites.add(player)
-
-    for obstacle in obstacles:
-        all_sprites.add(obstacle)
-
-    start_game = False
-    game_over = False
-    score = 0
+    # The sprites last for the whole session; playing again resets them in place
+    # instead of starting a new game_loop
+    obstacles = [Obstacle(0, 0, OBSTACLE_WIDTH, OBSTACLE_HEIGHT) for _ in range(3)]
+    # While a round runs only what changed is drawn: the sprites are erased with
+    # the background and drawn again, and only those rectangles (plus the score
+    # and the node panel) are sent to the display. With draw_first set, only the
+    # first draw_first agents still alive, in population order, are drawn; the
+    # others still play. Every agent alive has the same score, so this is not a
+    # ranking.
+    all_sprites = pygame.sprite.RenderUpdates()
 
     running = True
     while running:
-        if game_over:
-            best_score = max(best_score, score)
-            if not human_playing:
-                return [player.score for player in (players if not human_playing else [players[0]])]
-
-        clock.tick(FPS)
-        screen.fill(WHITE)
-
-        if auto_start or not start_game:
-            start_game = True
-
-        if not start_game:
-            draw_text("Press SPACE to start", 36, WINDOW_WIDTH // 2 - 100, WINDOW_HEIGHT // 2 - 50)
-        elif game_over:
-            draw_text("GAME OVER", 48, WINDOW_WIDTH // 2 - 100, WINDOW_HEIGHT // 2 - 100)
-            draw_text(f"Score: {score}", 36, WINDOW_WIDTH // 2 - 40, WINDOW_HEIGHT // 2 - 40)
-            draw_text(f"Best Score: {best_score}", 24, WINDOW_WIDTH // 2 - 55, WINDOW_HEIGHT // 2)
-            draw_text("Press SPACE to play again, ESC to exit", 24, WINDOW_WIDTH // 2 - 150, WINDOW_HEIGHT // 2 + 40)
-
-        else:
-            score += 1
-            for player in players:
-                player.score = score
-                if not human_playing and player.score > MAX_SCORE_THRESHOLD:
-                    player.alive = False
-            draw_text(f"Score: {score}", 24, 10, 10)
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_SPACE:
-                    if not start_game:
-                        start_game = True
-                    elif game_over:
-                        return game_loop(human_playing, agents, neural_networks, best_score)
-                    elif human_playing:
-                        player.jump()
-                if event.key == pygame.K_ESCAPE and game_over:
+        if course is None:
+            course = Course()
+        for i, obstacle in enumerate(obstacles):
+            obstacle.place(*course.obstacle(i))
+        next_obstacle = 3
+
+        # Indices of the agents still running; dead agents drop out and keep the score they died with
+        alive_agents = list(range(len(players)))
+
+        all_sprites.empty()
+        for player in players[:draw_first]:
+            all_sprites.add(player)
+
+        for obstacle in obstacles:
+            all_sprites.add(obstacle)
+
+        start_game = False
+        game_over = False
+        score = 0
+        # The whole window is drawn on the first frame of a round and on the game over screen
+        full_redraw = True
+        nodes_rect = None
+
+        play_again = False
+        # Game ticks owed to the clock but not run yet
+        ticks_due = 0.0
+        nodes_shown = None
+        while running and not play_again:
+            if game_over:
+                best_score = max(best_score, score)
+                if not human_playing:
+                    return [player.score for player in (players if not human_playing else [players[0]])]
+
+            t = profiler.clock()
+            speed = 1 if human_playing else game_speed
+            render_fps = FPS if 0 < speed < FAST_SPEED else SLOW_RENDER_FPS
+            elapsed = min(clock.tick(render_fps) / 1000.0, MAX_FRAME_TIME)
+            t = profiler.add_time("tick", t)
+            frame_start = time.perf_counter()
+
+            if auto_start or not start_game:
+                start_game = True
+
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
                     running = False
-                    break
-
-        if start_game and not game_over:
-            all_sprites.update()
-
-            # Handle agent collisions and remove dead agents
-            for obstacle in obstacles:
-                if human_playing:
-                    if player.rect.colliderect(obstacle.rect):
+                    pygame.quit()
+                    sys.exit()
+                if event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_SPACE:
+                        if not start_game:
+                            start_game = True
+                        elif game_over:
+                            for player in players:
+                                player.reset()
+                            course = None
+                            play_again = True
+                            break
+                        elif human_playing:
+                            player.jump()
+                    if event.key == pygame.K_ESCAPE and game_over:
+                        running = False
+                        break
+                    if event.key in SPEED_KEYS:
+                        game_speed = SPEED_KEYS[event.key]
+            t = profiler.add_time("events", t)
+
+            # Fixed timestep: the game runs FPS ticks per second times the speed
+            # (0 runs as many as fit in a frame), however often frames are drawn.
+            # Each tick is exactly one frame of the headless engines. When ticks
+            # can't keep up, the ones owed are dropped so frames still get drawn.
+            if start_game and not game_over:
+                ticks_due += elapsed * FPS * speed
+                deadline = frame_start + 1.0 / render_fps
+                ticks = 0
+                while not game_over and (speed == 0 or ticks_due >= 1):
+                    if ticks and time.perf_counter() >= deadline:
+                        ticks_due = 0.0
+                        break
+                    ticks += 1
+                    ticks_due -= 1
+                    profiler.count("frames")
+
+                    score += 1
+                    if not human_playing and score > MAX_SCORE_THRESHOLD:
+                        for i in alive_agents:
+                            players[i].score = score
+                            players[i].alive = False
+                        alive_agents = []
                         game_over = True
                         break
-                else:
-                    for i, player in enumerate(players):
-                        if player.rect.colliderect(obstacle.rect) and player.alive:
-                            player.alive = False
-                            alive_agents -= 1
-
-                if not human_playing and (alive_agents <= 0 or all(player.score > MAX_SCORE_THRESHOLD for player in players)):
-                    game_over = True
-
-            # Replace obstacles that have left the screen
-            for i, obstacle in enumerate(obstacles):
-                if obstacle.rect.x <= -OBSTACLE_WIDTH:
-                    all_sprites.remove(obstacle)
-                    new_obstacle = generate_obstacle(obstacles[i - 1].rect.x, min_separation)
-                    obstacles[i] = new_obstacle
-                    all_sprites.add(new_obstacle)
-
-            if not human_playing and neural_networks is not None:
-                for i, player in enumerate(players):
-                    if not player.alive:
-                        continue
-
-                    # Get inputs for the neural network
-                    closest_obstacles, on_ground = get_obstacle_info(player, obstacles)
-                    inputs = [info[0] for info in closest_obstacles] + \
-                             [info[2] for info in closest_obstacles] + \
-                             [int(on_ground)]
-
-                    output = neural_networks[i].activate(inputs)
-                    if output[0] > 0.5:
-                        player.jump()
-                    if i == 0:  # Show the nodes for the first agent
-                        draw_nodes(inputs, output, WINDOW_WIDTH - 150, 10)
-
-
-            all_sprites.draw(screen)
-
-        pygame.display.flip()
+
+                    # Agents left out of the drawing by draw_first still have to move
+                    for i in alive_agents:
+                        players[i].update()
+                    for obstacle in obstacles:
+                        obstacle.update()
+                    t = profiler.add_time("update", t)
+
+                    # Handle agent collisions and remove dead agents
+                    if human_playing:
+                        for obstacle in obstacles:
+                            if player.rect.colliderect(obstacle.rect):
+                                game_over = True
+                                break
+                    else:
+                        obstacle_rects = [obstacle.rect for obstacle in obstacles]
+                        survivors = []
+                        for i in alive_agents:
+                            player = players[i]
+                            if player.rect.collidelist(obstacle_rects) == -1:
+                                survivors.append(i)
+                            else:
+                                player.alive = False
+                                player.score = score
+                                all_sprites.remove(player)
+                                profiler.count("collisions")
+                        alive_agents = survivors
+                        if not alive_agents:
+                            game_over = True
+                        if draw_first is not None:
+                            # Agents move up into the drawn ones as others die
+                            for i in alive_agents[:draw_first]:
+                                all_sprites.add(players[i])
+                    t = profiler.add_time("collisions", t)
+
+                    # Replace obstacles that have left the screen
+                    for i, obstacle in enumerate(obstacles):
+                        if obstacle.rect.x <= -OBSTACLE_WIDTH:
+                            obstacle.place(*course.obstacle(next_obstacle, score))
+                            next_obstacle += 1
+                            profiler.count("spawns")
+                    t = profiler.add_time("obstacles", t)
+
+                    if not human_playing and neural_networks is not None:
+                        # Get the obstacle inputs for the neural networks, shared by every agent
+                        closest_obstacles = get_obstacle_info(obstacles, next_obstacle % 3)
+                        shared_inputs = [info[0] for info in closest_obstacles] + \
+                                        [info[2] for info in closest_obstacles]
+                        t = profiler.add_time("inputs", t)
+
+                        nodes_shown = None
+                        for i in alive_agents:
+                            player = players[i]
+                            on_ground = player.rect.y == WINDOW_HEIGHT - PLAYER_SIZE
+                            inputs = shared_inputs + [int(on_ground)]
+
+                            output = neural_networks[i].activate(inputs)
+                            if output[0] > 0.5:
+                                player.jump()
+                            if i == 0:  # Show the nodes for the first agent
+                                nodes_shown = (inputs, output)
+                        t = profiler.add_time("activate", t)
+                        profiler.count("activations", len(alive_agents))
+                        profiler.count("alive", len(alive_agents))
+
+            if game_over or not start_game:
+                full_redraw = True
+            if full_redraw:
+                screen.fill(WHITE)
+            else:
+                all_sprites.clear(screen, background)
+            dirty = []
+
+            if not start_game:
+                draw_text("Press SPACE to start", 36, WINDOW_WIDTH // 2 - 100, WINDOW_HEIGHT // 2 - 50)
+            elif game_over:
+                draw_text("GAME OVER", 48, WINDOW_WIDTH // 2 - 100, WINDOW_HEIGHT // 2 - 100)
+                draw_text(f"Score: {score}", 36, WINDOW_WIDTH // 2 - 40, WINDOW_HEIGHT // 2 - 40)
+                draw_text(f"Best Score: {best_score}", 24, WINDOW_WIDTH // 2 - 55, WINDOW_HEIGHT // 2)
+                draw_text("Press SPACE to play again, ESC to exit", 24, WINDOW_WIDTH // 2 - 150, WINDOW_HEIGHT // 2 + 40)
+            else:
+                dirty.append(score_field.draw(screen, score, 10, 10, background))
+                if not human_playing:
+                    dirty.append(speed_field.draw(screen, "{}x".format(speed) if speed else "max", 10, 30, background))
+
+                if nodes_rect is not None:
+                    screen.blit(background, nodes_rect, nodes_rect)
+                    dirty.append(nodes_rect)
+                    nodes_rect = None
+                if nodes_shown is not None:
+                    t = profiler.add_time("draw", t)
+                    nodes_rect = draw_nodes(nodes_shown[0], nodes_shown[1], WINDOW_WIDTH - 150, 10)
+                    dirty.append(nodes_rect)
+                    t = profiler.add_time("draw_nodes", t)
+
+                dirty.extend(all_sprites.draw(screen))
+            t = profiler.add_time("draw", t)
+
+            profiler.count("rendered")
+            if full_redraw:
+                pygame.display.flip()
+                full_redraw = False
+            else:
+                pygame.display.update(dirty)
+            profiler.add_time("flip", t)
 
     return score
 
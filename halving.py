@@ -0,0 +1,107 @@
+# halving.py
+# Successive halving over several courses. Every genome first plays a few short
+# courses; only the best fraction is promoted to the next rung, which plays
+# more courses for more frames, and so on. Most of the frames go to the
+# genomes that are worth a closer look, and those end up with a fitness
+# averaged over many courses instead of one lucky (or unlucky) one.
+#
+# The budgets live in the NEAT config file, in a section neat itself ignores:
+#
+#   [SuccessiveHalving]
+#   enabled          = True
+#   courses          = 2 4 8
+#   frames           = 1000 4000 12000
+#   promote_fraction = 0.5
+#
+# Rung k plays the first courses[k] course seeds for up to frames[k] frames, so
+# a rung replays the courses of the one before it, longer, plus new ones. A
+# genome's fitness is its mean score over the courses of the last rung it
+# reached, except that means over different rungs aren't comparable (a later
+# rung plays new, maybe harder, courses). So every genome culled at a rung is
+# scaled below the lowest fitness of the ones promoted past it, keeping their
+# order among themselves: reaching a later rung always ranks higher.
+import random
+import configparser
+from simulation import MAX_SCORE_THRESHOLD
+
+SECTION = 'SuccessiveHalving'
+
+
+class HalvingConfig:
+    def __init__(self, courses, frames, promote_fraction=0.5, enabled=True):
+        if not courses or len(courses) != len(frames):
+            raise ValueError("courses and frames need one entry per rung")
+        if any(n < 1 for n in courses) or any(f < 1 for f in frames):
+            raise ValueError("Every rung needs at least one course and one frame")
+        if list(courses) != sorted(courses) or list(frames) != sorted(frames):
+            raise ValueError("Rungs can't play fewer courses or frames than the rung before")
+        if frames[-1] > MAX_SCORE_THRESHOLD:
+            raise ValueError("Rungs can't play more than {0} frames".format(MAX_SCORE_THRESHOLD))
+        if not 0.0 < promote_fraction <= 1.0:
+            raise ValueError("promote_fraction must be in (0, 1]")
+        self.courses = list(courses)
+        self.frames = list(frames)
+        self.promote_fraction = promote_fraction
+        self.enabled = enabled
+
+    @staticmethod
+    def load(path):
+        # None when the config file has no [SuccessiveHalving] section
+        parameters = configparser.ConfigParser()
+        with open(path) as f:
+            parameters.read_file(f)
+        if not parameters.has_section(SECTION):
+            return None
+        section = parameters[SECTION]
+        return HalvingConfig([int(n) for n in section.get('courses').split()],
+                             [int(f) for f in section.get('frames').split()],
+                             section.getfloat('promote_fraction', 0.5),
+                             section.getboolean('enabled', True))
+
+
+def course_seeds(count, rng=random):
+    return [rng.getrandbits(32) for _ in range(count)]
+
+
+def successive_halving(genomes, halving, seeds, play):
+    # genomes: the generation's (genome_id, genome) pairs. play(genomes, seed,
+    # max_score) returns the scores of some of them on the course with that
+    # seed. Sets every genome's fitness and returns the frames played.
+    scores = {}
+    survivors = list(range(len(genomes)))
+    fitness = [0.0] * len(genomes)
+    culled = []
+    frames_played = 0
+    for rung, (num_courses, frames) in enumerate(zip(halving.courses, halving.frames)):
+        for seed in seeds[:num_courses]:
+            # scores maps (genome, seed) to (score, frame limit it was played
+            # with). A game that ended before the old limit ends the same way
+            # with a higher one, so only the genomes that reached it play again.
+            agents = []
+            for i in survivors:
+                score, limit = scores.get((i, seed), (None, 0))
+                if score is None or (score > limit and frames > limit):
+                    agents.append(i)
+            if agents:
+                for i, score in zip(agents, play([genomes[i] for i in agents], seed, frames)):
+                    scores[(i, seed)] = (score, frames)
+                    frames_played += score
+        for i in survivors:
+            fitness[i] = sum(scores[(i, seed)][0] for seed in seeds[:num_courses]) / float(num_courses)
+        if rung + 1 < len(halving.courses):
+            survivors.sort(key=lambda i: -fitness[i])
+            promoted = max(1, int(round(len(survivors) * halving.promote_fraction)))
+            culled.append(survivors[promoted:])
+            survivors = survivors[:promoted]
+    # From the last rung down, squeeze the genomes culled at each rung in under
+    # the lowest fitness of everyone who went further
+    floor = min(fitness[i] for i in survivors)
+    for rung in reversed(culled):
+        if rung:
+            top = max(fitness[i] for i in rung)
+            for i in rung:
+                fitness[i] = floor * fitness[i] / (top + 1.0)
+            floor = min(fitness[i] for i in rung)
+    for (genome_id, genome), value in zip(genomes, fitness):
+        genome.fitness = value
+    return frames_played
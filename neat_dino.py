@@ -1,12 +1,146 @@
 import os
+import argparse
 import neat
 import pickle
 import random
-from game import game_loop
-from game import Player, WINDOW_HEIGHT, PLAYER_SIZE
+from functools import partial
+from population import run_population
+from fast_forward import run_fast_forward
+from batch_nn import PopulationNetwork
+from parallel import ShardedEvaluator
+from shared_eval import SharedEvaluator
+from simulation import Course, MAX_SCORE_THRESHOLD
+from profiling import Profiler, NULL_PROFILER
+from netformat import CompactNetwork
+from replay import ReplayWriter, MIN_SEED, MAX_SEED
+from spectator import Spectator
+from checkpoint import Checkpointer, latest_checkpoint, restore_checkpoint
+from fitness_cache import FitnessCache, DEFAULT_CACHE_SIZE
+from species import VectorSpeciesSet
+from halving import HalvingConfig, course_seeds, successive_halving
 
 
-def eval_genomes(genomes, config):
+class ProfileReporter(neat.reporting.BaseReporter):
+    # Prints where each generation's evaluation time went, next to StdOutReporter.
+    # It lives here rather than in profiling.py so the frame loops don't import neat
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.generation = None
+        self.history = []
+
+    def start_generation(self, generation):
+        self.generation = generation
+        self.profiler.reset()
+
+    def post_evaluate(self, config, population, species, best_genome):
+        times, counters = self.profiler.snapshot()
+        self.history.append((self.generation, times, counters))
+
+        total = sum(times.values())
+        print("Profiled time: {0:.3f} sec".format(total))
+        for phase, seconds in sorted(times.items(), key=lambda item: -item[1]):
+            share = 100.0 * seconds / total if total else 0.0
+            print("    {0:<12} {1:9.3f} sec {2:5.1f}%".format(phase, seconds, share))
+        if counters:
+            print("Counters: " + ", ".join("{0}={1}".format(name, amount) for name, amount in sorted(counters.items())))
+
+class CacheReporter(neat.reporting.BaseReporter):
+    # Prints how many genomes the fitness cache saved from playing each generation
+    def __init__(self, cache):
+        self.cache = cache
+        self.generation = None
+        self.history = []
+
+    def start_generation(self, generation):
+        self.generation = generation
+        self.cache.reset_stats()
+
+    def post_evaluate(self, config, population, species, best_genome):
+        hits, misses = self.cache.hits, self.cache.misses
+        self.history.append((self.generation, hits, misses))
+        rate = 100.0 * hits / (hits + misses) if hits + misses else 0.0
+        print("Fitness cache: {0} hits, {1} misses ({2:.1f}% hit rate), {3} entries".format(hits, misses, rate, len(self.cache)))
+
+class SpectatorReporter(neat.reporting.BaseReporter):
+    # Sends the best networks of every generation to the viewer process, with
+    # the seed of the course the generation played
+    def __init__(self, spectator, num_agents=1):
+        self.spectator = spectator
+        self.num_agents = num_agents
+        self.course_seed = None
+        self.generation = None
+
+    def watch(self, fitness_function):
+        # Fitness functions here return the seed of the course every genome played
+        def evaluate(genomes, config):
+            self.course_seed = fitness_function(genomes, config)
+        return evaluate
+
+    def start_generation(self, generation):
+        self.generation = generation
+
+    def post_evaluate(self, config, population, species, best_genome):
+        best = sorted(population.values(), key=lambda genome: genome.fitness, reverse=True)[:self.num_agents]
+        networks = [CompactNetwork.from_genome(genome, config) for genome in best]
+        self.spectator.send(self.generation, best_genome.fitness, networks, self.course_seed)
+
+def eval_genomes(genomes, config, course=None, fast_forward=False, profiler=NULL_PROFILER, replay_path=None, cache=None,
+                 halving=None):
+    # Returns the seed of the course every genome played (with halving, the first one)
+    if halving is not None and halving.enabled:
+        if replay_path is not None:
+            raise ValueError("Recording plays a single course, so it can't be combined with successive halving")
+        # Several courses per generation; with a fixed course, its seed fixes all of them
+        seeds = course_seeds(max(halving.courses), random.Random(course.seed) if course is not None else random)
+        courses = dict((seed, Course(seed)) for seed in seeds)
+
+        def play(genomes, seed, max_score):
+            play_course(genomes, config, courses[seed], max_score, fast_forward, profiler, cache=cache)
+            return [genome.fitness for genome_id, genome in genomes]
+
+        profiler.count("halving_frames", successive_halving(genomes, halving, seeds, play))
+        return seeds[0]
+    return play_course(genomes, config, course, MAX_SCORE_THRESHOLD, fast_forward, profiler, replay_path, cache)
+
+def play_course(genomes, config, course=None, max_score=MAX_SCORE_THRESHOLD, fast_forward=False, profiler=NULL_PROFILER,
+                replay_path=None, cache=None):
+    # Sets the fitness of every genome to its score on one course and returns
+    # the course's seed. The course is picked first: cached scores only hold on
+    # the course they were played on, and the spectator replays it.
+    if course is None:
+        course = Course()
+    if cache is not None:
+        pending = cache.lookup(genomes, course.seed, max_score)
+        genomes = [(genome_id, genome) for genome_id, genome, key in pending]
+        if not genomes:
+            return course.seed
+
+    t = profiler.clock()
+    network = PopulationNetwork.create([genome for genome_id, genome in genomes], config)
+    profiler.add_time("compile", t)
+
+    if replay_path is not None:
+        # Recording needs every frame's decisions, so it always steps frame by frame
+        recorder = ReplayWriter(replay_path, course, len(genomes), max_score=max_score,
+                                agent_ids=[genome_id for genome_id, genome in genomes])
+        with recorder:
+            scores = run_population(network, course, max_score, profiler=profiler, recorder=recorder)
+            recorder.scores = scores
+    else:
+        run = run_fast_forward if fast_forward else run_population
+        scores = run(network, course, max_score, profiler=profiler)
+    for i, (genome_id, genome) in enumerate(genomes):
+        genome.fitness = scores[i]
+    if cache is not None:
+        for (genome_id, genome, key), score in zip(pending, scores):
+            cache.store(key, score)
+    return course.seed
+
+def eval_genomes_visual(genomes, config, profiler=NULL_PROFILER, draw_first=None):
+    # game needs pygame, so only load it when we actually want to watch
+    from game import game_loop
+    from game import Player, WINDOW_HEIGHT, PLAYER_SIZE
+
     nets = []
     agents = []
 
@@ -15,26 +149,144 @@ def eval_genomes(genomes, config):
         nets.append(net)
         agents.append(Player(50, WINDOW_HEIGHT - PLAYER_SIZE, (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))))
 
-    scores = game_loop(False, agents, neural_networks=nets)
+    scores = game_loop(False, agents, neural_networks=nets, profiler=profiler, draw_first=draw_first)
     for i, (genome_id, genome) in enumerate(genomes):
         genome.fitness = scores[i]
 
-def run_neat(config_path):
+def run_neat(config_path, visual=False, workers=1, chunk_size=None, generations=50, course_seed=None,
+             fast_forward=False, profile=False, checkpoint_dir='checkpoints', checkpoint_interval=5,
+             checkpoint_keep=3, resume=False, draw_first=None, record_dir=None, fitness_cache=DEFAULT_CACHE_SIZE,
+             vector_speciation=True, transport='shared', spectate=0):
+    if record_dir is not None and (visual or workers > 1):
+        raise ValueError("Recording only works with headless training in one process")
     config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction,
                          neat.DefaultSpeciesSet, neat.DefaultStagnation,
                          config_path)
+    if vector_speciation:
+        # Same species as DefaultSpeciesSet (and the same config section), much faster on big populations
+        config.species_set_type = VectorSpeciesSet
 
-    pop = neat.Population(config)
+    checkpoint = latest_checkpoint(checkpoint_dir) if resume else None
+    if checkpoint is not None:
+        print("Resuming from {0}".format(checkpoint))
+        pop = restore_checkpoint(checkpoint, config)
+    else:
+        pop = neat.Population(config)
     pop.add_reporter(neat.StdOutReporter(True))
     stats = neat.StatisticsReporter()
     pop.add_reporter(stats)
+    profiler = NULL_PROFILER
+    if profile:
+        profiler = Profiler()
+        pop.add_reporter(ProfileReporter(profiler))
+    checkpointer = None
+    if checkpoint_interval > 0:
+        checkpointer = Checkpointer(checkpoint_dir, checkpoint_interval, checkpoint_keep)
+        if checkpoint is not None:
+            checkpointer.best_genome = pop.best_genome
+        pop.add_reporter(checkpointer)
+    halving = HalvingConfig.load(config_path)
+    if halving is not None and not halving.enabled:
+        halving = None
+    if halving is not None and (visual or record_dir is not None):
+        print("Successive halving is off while watching or recording, which play a single course")
+        halving = None
+    # Every generation plays new courses unless the seed is fixed, and then nothing could ever hit
+    cache = None
+    if fitness_cache > 0 and course_seed is not None and not visual and record_dir is None:
+        cache = FitnessCache(fitness_cache)
+        pop.add_reporter(CacheReporter(cache))
 
-    winner = pop.run(eval_genomes, 50)  # You can adjust the number of generations if needed
+    evaluator = None
+    if visual:
+        fitness_function = partial(eval_genomes_visual, profiler=profiler, draw_first=draw_first)
+    elif record_dir is not None:
+        # Recording needs every frame's decisions, so it always steps frame by frame in this process
+        if fast_forward:
+            print("Fast forward is off while recording, which steps every frame")
+        os.makedirs(record_dir, exist_ok=True)
+        course = Course(course_seed) if course_seed is not None else None
+
+        def record_generation(genomes, config):
+            # Population.run has already moved pop.generation to the one being evaluated
+            replay_path = os.path.join(record_dir, 'generation-{0}.replay'.format(pop.generation))
+            return eval_genomes(genomes, config, course, profiler=profiler, replay_path=replay_path)
+        fitness_function = record_generation
+    elif workers > 1:
+        # 'shared' hands the workers compiled networks in shared memory, 'pickle' sends them the genomes
+        evaluator_type = SharedEvaluator if transport == 'shared' else ShardedEvaluator
+        evaluator = evaluator_type(workers, chunk_size, course_seed=course_seed, fast_forward=fast_forward, profiler=profiler,
+                                   cache=cache, halving=halving)
+        fitness_function = evaluator.evaluate
+    else:
+        course = Course(course_seed) if course_seed is not None else None
+        fitness_function = partial(eval_genomes, course=course, fast_forward=fast_forward, profiler=profiler, cache=cache,
+                                   halving=halving)
+    spectator = None
+    if spectate > 0:
+        spectator = Spectator()
+        reporter = SpectatorReporter(spectator, spectate)
+        pop.add_reporter(reporter)
+        fitness_function = reporter.watch(fitness_function)
+    # generations counts from the start of the run, including any resumed ones
+    try:
+        if pop.generation < generations:
+            winner = pop.run(fitness_function, generations - pop.generation)
+        elif pop.best_genome is not None:
+            print("The checkpoint is already at generation {0} of {1}; keeping its best genome".format(pop.generation, generations))
+            winner = pop.best_genome
+        else:
+            raise SystemExit("The checkpoint is already at generation {0} of {1} and has no best genome; "
+                             "raise --generations to train further".format(pop.generation, generations))
+    finally:
+        if checkpointer is not None:
+            checkpointer.wait()
+        if spectator is not None:
+            spectator.close()
+        if evaluator is not None:
+            evaluator.close()
 
     with open('winner.pkl', 'wb') as f:
         pickle.dump(winner, f)
+    CompactNetwork.from_genome(winner, config).save('winner.net')
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--visual', action='store_true', help='watch every generation in the game window (much slower)')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes used to evaluate each generation')
+    parser.add_argument('--chunk-size', type=int, default=None, help='genomes per worker task (default: one shard per worker)')
+    parser.add_argument('--generations', type=int, default=50)
+    parser.add_argument('--course-seed', type=int, default=None, help='play the same seeded course every generation')
+    parser.add_argument('--fast-forward', action='store_true', help='skip between decision points instead of stepping every frame')
+    parser.add_argument('--profile', action='store_true', help='report time per frame phase and counters every generation')
+    parser.add_argument('--checkpoint-dir', default='checkpoints')
+    parser.add_argument('--checkpoint-interval', type=int, default=5, help='generations between checkpoints (0 disables them)')
+    parser.add_argument('--checkpoint-keep', type=int, default=3, help='number of checkpoints to keep')
+    parser.add_argument('--resume', action='store_true', help='continue from the latest checkpoint in --checkpoint-dir')
+    parser.add_argument('--draw-first', type=int, default=None, help='with --visual, only draw the first N agents still alive (by position in the population, not by score)')
+    parser.add_argument('--record', default=None, metavar='DIR', help='write a replay of every generation into DIR (see replay.py)')
+    parser.add_argument('--fitness-cache', type=int, default=DEFAULT_CACHE_SIZE, metavar='SIZE',
+                        help='with --course-seed, reuse the fitness of up to SIZE unchanged genomes (0 disables it)')
+    parser.add_argument('--transport', choices=['shared', 'pickle'], default='shared',
+                        help='with --workers, how networks reach the workers: shared memory or pickled genomes')
+    parser.add_argument('--spectate', type=int, default=0, metavar='N',
+                        help='show the best N agents of each generation in a separate window while training runs headless')
+    parser.add_argument('--neat-speciation', action='store_true', help="use neat's own pure-Python speciation")
+    args = parser.parse_args()
+    if args.record and (args.visual or args.workers > 1):
+        parser.error('--record only works with headless training in one process')
+    if args.record and args.course_seed is not None and not MIN_SEED <= args.course_seed <= MAX_SEED:
+        parser.error('--course-seed must be from {0} to {1} to be recorded'.format(MIN_SEED, MAX_SEED))
+    if args.checkpoint_keep < 1:
+        parser.error('--checkpoint-keep must be at least 1')
+    if args.spectate and args.visual:
+        parser.error('--spectate is for headless training; --visual already shows every generation')
+
     local_dir = os.path.dirname(__file__)
     config_path = os.path.join(local_dir, 'config-feedforward.txt')
-    run_neat(config_path)
\ No newline at end of file
+    run_neat(config_path, visual=args.visual, workers=args.workers, chunk_size=args.chunk_size, generations=args.generations,
+             course_seed=args.course_seed, fast_forward=args.fast_forward, profile=args.profile,
+             checkpoint_dir=args.checkpoint_dir, checkpoint_interval=args.checkpoint_interval,
+             checkpoint_keep=args.checkpoint_keep, resume=args.resume, draw_first=args.draw_first, record_dir=args.record,
+             fitness_cache=args.fitness_cache, vector_speciation=not args.neat_speciation, transport=args.transport,
+             spectate=args.spectate)
@@ -0,0 +1,254 @@
+# netformat.py
+# A small binary format for trained feed-forward networks, and an evaluator for
+# it that needs neither neat nor pickle. A file is a fixed header followed by
+# flat little-endian arrays:
+#   header    magic, version, inputs, outputs, nodes, links
+#   per node  activation, aggregation, link count, bias, response
+#   per link  source column, weight
+#   outputs   column of each output
+# Columns index the value buffer: the inputs first, then a column that is always
+# 0.0 (outputs that are never evaluated), then one column per node in order.
+#
+#   python netformat.py winner.pkl winner.net
+import sys
+import math
+import struct
+from array import array
+from functools import reduce
+from operator import mul
+
+MAGIC = b'DNET'
+VERSION = 1
+HEADER = struct.Struct('<4sHHHII')
+
+
+# Same definitions as neat's built-in functions, so outputs match exactly
+def sigmoid_activation(z):
+    z = max(-60.0, min(60.0, 5.0 * z))
+    return 1.0 / (1.0 + math.exp(-z))
+
+def tanh_activation(z):
+    z = max(-60.0, min(60.0, 2.5 * z))
+    return math.tanh(z)
+
+def sin_activation(z):
+    z = max(-60.0, min(60.0, 5.0 * z))
+    return math.sin(z)
+
+def gauss_activation(z):
+    z = max(-3.4, min(3.4, z))
+    return math.exp(-5.0 * z**2)
+
+def relu_activation(z):
+    return z if z > 0.0 else 0.0
+
+def softplus_activation(z):
+    z = max(-60.0, min(60.0, 5.0 * z))
+    return 0.2 * math.log(1 + math.exp(z))
+
+def identity_activation(z):
+    return z
+
+def clamped_activation(z):
+    return max(-1.0, min(1.0, z))
+
+def inv_activation(z):
+    try:
+        return 1.0 / z
+    except ArithmeticError:
+        return 0.0
+
+def log_activation(z):
+    return math.log(max(1e-7, z))
+
+def exp_activation(z):
+    return math.exp(max(-60.0, min(60.0, z)))
+
+def hat_activation(z):
+    return max(0.0, 1 - abs(z))
+
+def square_activation(z):
+    return z ** 2
+
+def cube_activation(z):
+    return z ** 3
+
+def product_aggregation(x):
+    return reduce(mul, x, 1.0)
+
+def maxabs_aggregation(x):
+    return max(x, key=abs)
+
+def mean_aggregation(x):
+    return sum(map(float, x)) / len(x)
+
+def median_aggregation(x):
+    n = len(x)
+    if n <= 2:
+        return mean_aggregation(x)
+    x = sorted(x)
+    if n % 2 == 1:
+        return x[n // 2]
+    return (x[n // 2 - 1] + x[n // 2]) / 2.0
+
+
+# The position in these lists is the code stored in the file, so only append
+ACTIVATIONS = [
+    ('sigmoid', sigmoid_activation), ('tanh', tanh_activation), ('sin', sin_activation),
+    ('gauss', gauss_activation), ('relu', relu_activation), ('softplus', softplus_activation),
+    ('identity', identity_activation), ('clamped', clamped_activation), ('inv', inv_activation),
+    ('log', log_activation), ('exp', exp_activation), ('abs', abs), ('hat', hat_activation),
+    ('square', square_activation), ('cube', cube_activation),
+]
+AGGREGATIONS = [
+    ('product', product_aggregation), ('sum', sum), ('max', max), ('min', min),
+    ('maxabs', maxabs_aggregation), ('median', median_aggregation), ('mean', mean_aggregation),
+]
+ACTIVATION_CODES = dict((name, code) for code, (name, func) in enumerate(ACTIVATIONS))
+AGGREGATION_CODES = dict((name, code) for code, (name, func) in enumerate(AGGREGATIONS))
+
+
+class CompactNetwork:
+    def __init__(self, num_inputs, activations, aggregations, link_counts, biases, responses, sources, weights, outputs):
+        self.num_inputs = num_inputs
+        # The flat arrays, as stored in the file
+        self.activations = array('B', activations)
+        self.aggregations = array('B', aggregations)
+        self.link_counts = array('I', link_counts)
+        self.biases = array('d', biases)
+        self.responses = array('d', responses)
+        self.sources = array('I', sources)
+        self.weights = array('d', weights)
+        self.outputs = array('I', outputs)
+        if len(self.sources) != sum(self.link_counts) or len(self.weights) != len(self.sources):
+            raise ValueError("Link arrays don't match the link counts")
+
+        # Unpacked once into what activate() loops over
+        first_node = num_inputs + 1
+        num_columns = first_node + len(self.biases)
+        if any(column >= num_columns for column in self.sources) or any(column >= num_columns for column in self.outputs):
+            raise ValueError("Column out of range")
+        self.node_evals = []
+        start = 0
+        for k, count in enumerate(self.link_counts):
+            links = tuple(zip(self.sources[start:start + count], self.weights[start:start + count]))
+            start += count
+            self.node_evals.append((first_node + k, ACTIVATIONS[self.activations[k]][1],
+                                    AGGREGATIONS[self.aggregations[k]][1], self.biases[k], self.responses[k], links))
+        self.values = [0.0] * num_columns
+
+    def activate(self, inputs):
+        # Drop-in for neat's FeedForwardNetwork.activate
+        if len(inputs) != self.num_inputs:
+            raise RuntimeError("Expected {0:n} inputs, got {1:n}".format(self.num_inputs, len(inputs)))
+        values = self.values
+        values[:self.num_inputs] = inputs
+        for column, act_func, agg_func, bias, response, links in self.node_evals:
+            values[column] = act_func(bias + response * agg_func([values[i] * w for i, w in links]))
+        return [values[i] for i in self.outputs]
+
+    def dumps(self):
+        header = HEADER.pack(MAGIC, VERSION, self.num_inputs, len(self.outputs), len(self.biases), len(self.sources))
+        body = []
+        for values in (self.activations, self.aggregations, self.link_counts, self.biases, self.responses,
+                       self.sources, self.weights, self.outputs):
+            if sys.byteorder == 'big':
+                values = array(values.typecode, values)
+                values.byteswap()
+            body.append(values.tobytes())
+        return header + b''.join(body)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.dumps())
+
+    @staticmethod
+    def loads(data):
+        if len(data) < HEADER.size:
+            raise ValueError("Not a network file: too short")
+        magic, version, num_inputs, num_outputs, num_nodes, num_links = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("Not a network file: bad magic {0!r}".format(magic))
+        if version != VERSION:
+            raise ValueError("Unsupported network file version {0} (expected {1})".format(version, VERSION))
+
+        offset = HEADER.size
+        arrays = []
+        for typecode, length in (('B', num_nodes), ('B', num_nodes), ('I', num_nodes), ('d', num_nodes), ('d', num_nodes),
+                                 ('I', num_links), ('d', num_links), ('I', num_outputs)):
+            values = array(typecode)
+            end = offset + length * values.itemsize
+            if end > len(data):
+                raise ValueError("Network file is truncated")
+            values.frombytes(data[offset:end])
+            if sys.byteorder == 'big':
+                values.byteswap()
+            arrays.append(values)
+            offset = end
+        if offset != len(data):
+            raise ValueError("Network file has {0} trailing bytes".format(len(data) - offset))
+        if max(arrays[0], default=0) >= len(ACTIVATIONS) or max(arrays[1], default=0) >= len(AGGREGATIONS):
+            raise ValueError("Unknown activation or aggregation code")
+        return CompactNetwork(num_inputs, *arrays)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return CompactNetwork.loads(f.read())
+
+    @staticmethod
+    def from_feedforward(net, config):
+        # Takes neat's FeedForwardNetwork (for its node order and link order) and the
+        # config it was built with (for the names of the activation functions)
+        genome_config = config.genome_config
+        activation_names = dict((func, name) for name, func in genome_config.activation_defs.functions.items())
+        aggregation_names = dict((func, name) for name, func in genome_config.aggregation_function_defs.functions.items())
+
+        columns = dict((key, k) for k, key in enumerate(net.input_nodes))
+        zero_column = len(net.input_nodes)
+        activations, aggregations, link_counts, biases, responses, sources, weights = [], [], [], [], [], [], []
+        for k, (node, act_func, agg_func, bias, response, links) in enumerate(net.node_evals):
+            activation = activation_names.get(act_func)
+            aggregation = aggregation_names.get(agg_func)
+            if activation not in ACTIVATION_CODES or aggregation not in AGGREGATION_CODES:
+                raise ValueError("Can't export node {0} with {1}/{2}".format(node, activation, aggregation))
+            activations.append(ACTIVATION_CODES[activation])
+            aggregations.append(AGGREGATION_CODES[aggregation])
+            link_counts.append(len(links))
+            biases.append(bias)
+            responses.append(response)
+            for source, weight in links:
+                sources.append(columns.get(source, zero_column))
+                weights.append(weight)
+            columns[node] = zero_column + 1 + k
+        outputs = [columns.get(key, zero_column) for key in net.output_nodes]
+        return CompactNetwork(len(net.input_nodes), activations, aggregations, link_counts, biases, responses,
+                              sources, weights, outputs)
+
+    @staticmethod
+    def from_genome(genome, config):
+        import neat
+        return CompactNetwork.from_feedforward(neat.nn.FeedForwardNetwork.create(genome, config), config)
+
+
+if __name__ == '__main__':
+    import os
+    import pickle
+    import argparse
+    import neat
+
+    parser = argparse.ArgumentParser(description='Convert a pickled genome into the compact network format')
+    parser.add_argument('genome', nargs='?', default='winner.pkl')
+    parser.add_argument('output', nargs='?', default='winner.net')
+    parser.add_argument('--config', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config-feedforward.txt'))
+    args = parser.parse_args()
+
+    config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                         neat.DefaultSpeciesSet, neat.DefaultStagnation,
+                         args.config)
+    with open(args.genome, 'rb') as f:
+        genome = pickle.load(f)
+    network = CompactNetwork.from_genome(genome, config)
+    network.save(args.output)
+    print("Wrote {0}: {1} nodes, {2} links, {3} bytes".format(args.output, len(network.biases), len(network.sources),
+                                                              len(network.dumps())))
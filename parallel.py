@@ -0,0 +1,115 @@
+# parallel.py
+# Splits a generation across a process pool, like neat.ParallelEvaluator, but
+# every shard plays the same obstacle course. Agents never interact, so running
+# the population in shards gives exactly the scores of one big shared game.
+import multiprocessing
+import random
+from functools import lru_cache
+from population import run_population
+from fast_forward import run_fast_forward
+from batch_nn import PopulationNetwork
+from simulation import Course, MAX_SCORE_THRESHOLD
+from halving import course_seeds, successive_halving
+from profiling import Profiler, NULL_PROFILER
+
+
+@lru_cache(maxsize=16)
+def shared_course(seed):
+    # Workers keep recent courses, so a fixed course seed is only generated once per process
+    return Course(seed)
+
+
+def evaluate_shard(genomes, config, seed, max_score=MAX_SCORE_THRESHOLD, fast_forward=False, profile=False):
+    # Returns the scores and, when profiling, the worker's timers and counters
+    profiler = Profiler() if profile else NULL_PROFILER
+    t = profiler.clock()
+    network = PopulationNetwork.create(genomes, config)
+    profiler.add_time("compile", t)
+    run = run_fast_forward if fast_forward else run_population
+    return run(network, shared_course(seed), max_score, profiler=profiler), profiler.snapshot()
+
+
+class ShardedEvaluator:
+    def __init__(self, num_workers=None, chunk_size=None, timeout=None, seed=None, course_seed=None, fast_forward=False, profiler=NULL_PROFILER,
+                 cache=None, halving=None):
+        self.num_workers = num_workers or multiprocessing.cpu_count()
+        # Default is one shard per worker; smaller shards balance better when a
+        # few agents survive much longer than the rest
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        # Without a seed, course seeds come from the global random state, which checkpoints save
+        self.rng = random.Random(seed) if seed is not None else random
+        # With a course seed every generation plays the same course
+        self.course_seed = course_seed
+        self.fast_forward = fast_forward
+        self.profiler = profiler
+        # A fitness_cache.FitnessCache; genomes it knows are never sent to the workers
+        self.cache = cache
+        # A halving.HalvingConfig, to play several courses per generation
+        self.halving = halving
+        self.pool = multiprocessing.Pool(self.num_workers)
+
+    def close(self):
+        # Stops the workers. Call it (or use a with block) when done evaluating;
+        # __del__ only catches evaluators that were never closed.
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        if getattr(self, 'pool', None) is not None:
+            self.close()
+
+    def shards(self, genomes):
+        chunk_size = self.chunk_size or max(1, -(-len(genomes) // self.num_workers))
+        return [genomes[i:i + chunk_size] for i in range(0, len(genomes), chunk_size)]
+
+    def evaluate(self, genomes, config):
+        # Returns the seed of the course every genome played (with halving, the first one)
+        if self.halving is not None and self.halving.enabled:
+            # Several courses per generation; a fixed course seed fixes all of them
+            rng = random.Random(self.course_seed) if self.course_seed is not None else self.rng
+            seeds = course_seeds(max(self.halving.courses), rng)
+
+            def play(genomes, seed, max_score):
+                self.play(genomes, config, seed, max_score)
+                return [genome.fitness for genome_id, genome in genomes]
+
+            self.profiler.count("halving_frames", successive_halving(genomes, self.halving, seeds, play))
+            return seeds[0]
+        # One course per generation, shared by every shard
+        seed = self.course_seed if self.course_seed is not None else self.rng.getrandbits(32)
+        self.play(genomes, config, seed)
+        return seed
+
+    def play(self, genomes, config, seed, max_score=MAX_SCORE_THRESHOLD):
+        if self.cache is not None:
+            pending = self.cache.lookup(genomes, seed, max_score)
+            genomes = [(genome_id, genome) for genome_id, genome, key in pending]
+            keys = dict((genome_id, key) for genome_id, genome, key in pending)
+        scores = self.run_shards([genome for genome_id, genome in genomes], config, seed, max_score)
+        for (genome_id, genome), score in zip(genomes, scores):
+            genome.fitness = score
+            if self.cache is not None:
+                self.cache.store(keys[genome_id], score)
+
+    def run_shards(self, genomes, config, seed, max_score):
+        # The scores of the genomes, in order; the genomes are pickled to the workers
+        shards = self.shards(genomes)
+        jobs = []
+        for shard in shards:
+            jobs.append(self.pool.apply_async(evaluate_shard, (shard, config, seed, max_score, self.fast_forward, self.profiler.enabled)))
+
+        scores = []
+        for job in jobs:
+            shard_scores, snapshot = job.get(timeout=self.timeout)
+            self.profiler.merge(snapshot)
+            scores.extend(shard_scores)
+        return scores
@@ -0,0 +1,136 @@
+# population.py
+# Batched version of simulation.HeadlessGame. The whole population lives in
+# NumPy arrays so physics and collisions cost a handful of array operations
+# per frame instead of a Python loop over every agent and obstacle.
+import numpy as np
+from simulation import GROUND_Y, PLAYER_X, PLAYER_SIZE, JUMP_VELOCITY, GRAVITY, OBSTACLE_SPEED, OBSTACLE_WIDTH
+from simulation import MAX_SCORE_THRESHOLD
+from simulation import Course
+from profiling import NULL_PROFILER
+
+NUM_INPUTS = 7
+
+
+class PopulationGame:
+    def __init__(self, num_agents, course=None, max_score=MAX_SCORE_THRESHOLD):
+        self.course = course if course is not None else Course()
+        self.max_score = max_score
+        # One row per obstacle: x, y, width, height
+        self.obstacles = np.array([self.course.obstacle(i) for i in range(3)], dtype=np.int64)
+        self.next_obstacle = 3
+        # Only agents still running are kept; y and y_velocity line up with
+        # self.agents, and a dead agent's score is written once when it dies
+        self.agents = np.arange(num_agents)
+        self.y = np.full(num_agents, GROUND_Y, dtype=np.int64)
+        self.y_velocity = np.zeros(num_agents, dtype=np.int64)
+        self.scores = np.zeros(num_agents, dtype=np.int64)
+        self.score = 0
+        self.game_over = num_agents == 0
+
+    @property
+    def alive(self):
+        alive = np.zeros(len(self.scores), dtype=bool)
+        alive[self.agents] = True
+        return alive
+
+    def kill(self, hit):
+        self.scores[self.agents[hit]] = self.score
+        survivors = ~hit
+        self.agents = self.agents[survivors]
+        self.y = self.y[survivors]
+        self.y_velocity = self.y_velocity[survivors]
+        self.game_over = len(self.agents) == 0
+
+    def advance(self, profiler=NULL_PROFILER):
+        self.score += 1
+        profiler.count("frames")
+        if self.score > self.max_score:
+            self.kill(np.ones(len(self.agents), dtype=bool))
+            return
+
+        t = profiler.clock()
+        self.y_velocity += GRAVITY
+        self.y += self.y_velocity
+        landed = self.y > GROUND_Y
+        self.y[landed] = GROUND_Y
+        self.y_velocity[landed] = 0
+
+        self.obstacles[:, 0] -= OBSTACLE_SPEED
+        t = profiler.add_time("update", t)
+
+        # Every agent shares the same x, so the x half of the AABB test is one
+        # scalar check per obstacle and only the y half is per agent
+        hit = np.zeros(len(self.agents), dtype=bool)
+        for x, y, width, height in self.obstacles.tolist():
+            if PLAYER_X < x + width and x < PLAYER_X + PLAYER_SIZE:
+                hit |= (self.y < y + height) & (y < self.y + PLAYER_SIZE)
+        if hit.any():
+            profiler.count("collisions", int(hit.sum()))
+            self.kill(hit)
+        t = profiler.add_time("collisions", t)
+
+        # Replace obstacles that have left the screen
+        for i in range(len(self.obstacles)):
+            if self.obstacles[i, 0] <= -OBSTACLE_WIDTH:
+                self.obstacles[i] = self.course.obstacle(self.next_obstacle, self.score)
+                self.next_obstacle += 1
+                profiler.count("spawns")
+        profiler.add_time("obstacles", t)
+
+    def inputs(self):
+        # Same 7 features as game.py, one row per agent in self.agents. The
+        # obstacle rows are a ring buffer, so starting at the slot of the
+        # leftmost obstacle reads them in x order without sorting.
+        order = (self.next_obstacle + np.arange(3)) % 3
+        inputs = np.empty((len(self.agents), NUM_INPUTS))
+        inputs[:, 0:3] = self.obstacles[order, 0] - PLAYER_X - PLAYER_SIZE
+        inputs[:, 3:6] = self.obstacles[order, 3]
+        inputs[:, 6] = self.y == GROUND_Y
+        return inputs
+
+    def jump(self, jumps):
+        # jumps lines up with self.agents
+        self.y_velocity[jumps & (self.y == GROUND_Y)] = JUMP_VELOCITY
+
+    def snapshot(self):
+        # Everything that changes from frame to frame; the course is shared
+        return (self.obstacles.copy(), self.next_obstacle, self.agents.copy(), self.y.copy(),
+                self.y_velocity.copy(), self.scores.copy(), self.score, self.game_over)
+
+    def restore(self, state):
+        obstacles, self.next_obstacle, agents, y, y_velocity, scores, self.score, self.game_over = state
+        self.obstacles = obstacles.copy()
+        self.agents = agents.copy()
+        self.y = y.copy()
+        self.y_velocity = y_velocity.copy()
+        self.scores = scores.copy()
+
+
+def jump_mask(neural_networks, inputs, agents):
+    # A batch_nn.PopulationNetwork decides for every agent in one call,
+    # anything else is treated as a list of per-agent networks
+    if hasattr(neural_networks, "jump_mask"):
+        return neural_networks.jump_mask(inputs, agents)
+    jumps = [neural_networks[i].activate(row)[0] > 0.5 for i, row in zip(agents.tolist(), inputs.tolist())]
+    return np.array(jumps, dtype=bool)
+
+
+def run_population(neural_networks, course=None, max_score=MAX_SCORE_THRESHOLD, profiler=NULL_PROFILER, recorder=None):
+    # recorder, e.g. a replay.ReplayWriter, is handed every frame's jump decisions
+    game = PopulationGame(len(neural_networks), course, max_score)
+    while not game.game_over:
+        game.advance(profiler)
+        if game.game_over:
+            break
+        t = profiler.clock()
+        inputs = game.inputs()
+        t = profiler.add_time("inputs", t)
+        jumps = jump_mask(neural_networks, inputs, game.agents)
+        t = profiler.add_time("activate", t)
+        if recorder is not None:
+            recorder.record(game.agents, jumps)
+        game.jump(jumps)
+        profiler.add_time("update", t)
+        profiler.count("alive", len(game.agents))
+        profiler.count("activations", len(game.agents))
+    return game.scores.tolist()
@@ -0,0 +1,72 @@
+# profiling.py
+# Opt-in timers and counters for the frame loops. Loops take a profiler
+# argument that defaults to NULL_PROFILER, whose methods do nothing, so leaving
+# profiling off costs one empty method call per phase.
+#
+#   t = profiler.clock()
+#   ...update...
+#   t = profiler.add_time("update", t)
+#   ...collisions...
+#   t = profiler.add_time("collisions", t)
+import time
+from collections import defaultdict
+
+
+class Profiler:
+    enabled = True
+
+    def __init__(self):
+        self.times = defaultdict(float)
+        self.counters = defaultdict(int)
+
+    def clock(self):
+        return time.perf_counter()
+
+    def add_time(self, phase, start):
+        now = time.perf_counter()
+        self.times[phase] += now - start
+        return now
+
+    def count(self, counter, amount=1):
+        self.counters[counter] += amount
+
+    def snapshot(self):
+        return dict(self.times), dict(self.counters)
+
+    def merge(self, snapshot):
+        # Adds the snapshot of another profiler, e.g. one from a worker process
+        times, counters = snapshot
+        for phase, seconds in times.items():
+            self.times[phase] += seconds
+        for counter, amount in counters.items():
+            self.counters[counter] += amount
+
+    def reset(self):
+        self.times.clear()
+        self.counters.clear()
+
+
+class NullProfiler:
+    enabled = False
+
+    def clock(self):
+        return 0.0
+
+    def add_time(self, phase, start):
+        return 0.0
+
+    def count(self, counter, amount=1):
+        pass
+
+    def snapshot(self):
+        return {}, {}
+
+    def merge(self, snapshot):
+        pass
+
+    def reset(self):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
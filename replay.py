@@ -0,0 +1,271 @@
+# replay.py
+# Recorded episodes. A replay holds the course seed and every frame's jump
+# decisions, one bit per agent, so an episode can be played again exactly, at
+# any speed or with no window at all, without running the networks.
+#
+# File layout (little-endian):
+#   header   magic, version, course seed, min separation, max score, agents
+#   ids      one int64 per agent (e.g. the genome key)
+#   frames   one bitmask of (agents + 7) // 8 bytes per frame, from frame 1,
+#            bit i set if agent i's network asked to jump on that frame
+#   trailer  the final scores, the number of frames and END_MAGIC; written on
+#            close, so a replay cut short by a crash still plays up to where it stops
+#
+#   python replay.py replays/generation-12.replay --check
+#   python replay.py replays/generation-12.replay --watch --best
+import os
+import struct
+import numpy as np
+from simulation import MAX_SCORE_THRESHOLD
+from simulation import Course
+from population import PopulationGame
+
+MAGIC = b'DRPL'
+END_MAGIC = b'DEND'
+VERSION = 1
+HEADER = struct.Struct('<4sHqIII')
+# The course seed is a signed 64-bit field of the header
+MIN_SEED = -2 ** 63
+MAX_SEED = 2 ** 63 - 1
+TRAILER = struct.Struct('<I4s')
+# The player keeps a snapshot every this many frames, so seeking back is cheap
+KEYFRAME_INTERVAL = 500
+
+
+class ReplayWriter:
+    # Streams the jump decisions to disk as the game runs:
+    #   recorder = ReplayWriter(path, course, len(networks))
+    #   scores = run_population(networks, course, recorder=recorder)
+    #   recorder.close(scores)
+    def __init__(self, path, course, num_agents, max_score=MAX_SCORE_THRESHOLD, agent_ids=None):
+        if not MIN_SEED <= course.seed <= MAX_SEED:
+            raise ValueError("A replay can only record course seeds from {0} to {1}, got {2}".format(MIN_SEED, MAX_SEED, course.seed))
+        self.num_agents = num_agents
+        self.num_frames = 0
+        self.scores = None
+        self.jumps = np.zeros(num_agents, dtype=bool)
+        if agent_ids is None:
+            agent_ids = range(num_agents)
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, course.seed, course.min_separation, max_score, num_agents))
+        self.file.write(np.asarray(agent_ids, dtype='<i8').tobytes())
+
+    def record(self, agents, jumps):
+        # jumps lines up with agents, the ones still running; the rest are written as 0
+        self.jumps[:] = False
+        self.jumps[agents] = jumps
+        self.file.write(np.packbits(self.jumps, bitorder='little').tobytes())
+        self.num_frames += 1
+
+    def close(self, scores=None):
+        if scores is not None:
+            self.scores = scores
+        if self.file.closed:
+            return
+        if self.scores is not None:
+            self.file.write(np.asarray(self.scores, dtype='<i8').tobytes())
+            self.file.write(TRAILER.pack(self.num_frames, END_MAGIC))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Replay:
+    def __init__(self, seed, min_separation, max_score, agent_ids, masks, scores=None):
+        self.seed = seed
+        self.min_separation = min_separation
+        self.max_score = max_score
+        self.agent_ids = agent_ids
+        # (frames, bytes per frame) array of packed bits; row k is frame k + 1
+        self.masks = masks
+        # None when the recording was cut short
+        self.scores = scores
+
+    @property
+    def num_agents(self):
+        return len(self.agent_ids)
+
+    @property
+    def num_frames(self):
+        return len(self.masks)
+
+    def course(self):
+        return Course(self.seed, self.min_separation)
+
+    def jumps(self, frame):
+        # Every agent's decision on the given frame (counted from 1, like the score)
+        return np.unpackbits(self.masks[frame - 1], count=self.num_agents, bitorder='little').astype(bool)
+
+    def jumped(self, frame, agent):
+        if not 0 < frame <= len(self.masks):
+            return False
+        return bool(self.masks[frame - 1, agent >> 3] >> (agent & 7) & 1)
+
+    @staticmethod
+    def loads(data):
+        if len(data) < HEADER.size:
+            raise ValueError("Not a replay file: too short")
+        magic, version, seed, min_separation, max_score, num_agents = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("Not a replay file: bad magic {0!r}".format(magic))
+        if version != VERSION:
+            raise ValueError("Unsupported replay version {0} (expected {1})".format(version, VERSION))
+        offset = HEADER.size + 8 * num_agents
+        if len(data) < offset:
+            raise ValueError("Replay file is truncated")
+        agent_ids = np.frombuffer(data, dtype='<i8', count=num_agents, offset=HEADER.size).tolist()
+        mask_size = (num_agents + 7) // 8
+
+        scores = None
+        end = len(data)
+        trailer_size = 8 * num_agents + TRAILER.size
+        if end - offset >= trailer_size and data[-4:] == END_MAGIC:
+            num_frames, _ = TRAILER.unpack_from(data, end - TRAILER.size)
+            if offset + num_frames * mask_size + trailer_size == end:
+                scores = np.frombuffer(data, dtype='<i8', count=num_agents, offset=end - trailer_size).tolist()
+                end -= trailer_size
+        # Without a trailer only whole frames count
+        num_frames = (end - offset) // mask_size if mask_size else 0
+        masks = np.frombuffer(data, dtype=np.uint8, count=num_frames * mask_size, offset=offset)
+        return Replay(seed, min_separation, max_score, agent_ids, masks.reshape(num_frames, mask_size), scores)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return Replay.loads(f.read())
+
+
+class ReplayPlayer:
+    # Plays a replay through the same PopulationGame the recording came from,
+    # frame by frame or jumping straight to any frame
+    def __init__(self, replay, keyframe_interval=KEYFRAME_INTERVAL):
+        self.replay = replay
+        self.keyframe_interval = keyframe_interval
+        self.course = replay.course()
+        self.keyframes = {}
+        self.restart()
+
+    def restart(self):
+        self.game = PopulationGame(self.replay.num_agents, self.course, self.replay.max_score)
+        self.truncated = False
+
+    @property
+    def frame(self):
+        return self.game.score
+
+    @property
+    def finished(self):
+        return self.game.game_over or self.truncated
+
+    def step(self):
+        # Plays one frame; False once the episode (or the recording) is over
+        if self.finished:
+            return False
+        game = self.game
+        game.advance()
+        if game.game_over:
+            return False
+        if game.score > self.replay.num_frames:
+            # The recording stops here, so what the agents would do next is unknown
+            self.truncated = True
+            return False
+        game.jump(self.replay.jumps(game.score)[game.agents])
+        if game.score % self.keyframe_interval == 0:
+            self.keyframes[game.score] = game.snapshot()
+        return True
+
+    def seek(self, frame):
+        # Leaves the player just after the given frame (0 is the start), starting
+        # from the closest snapshot before it when that saves frames
+        keyframe = max((k for k in self.keyframes if k <= frame), default=None)
+        if keyframe is not None and (frame < self.frame or keyframe > self.frame):
+            self.game.restore(self.keyframes[keyframe])
+            self.truncated = False
+        elif frame < self.frame:
+            self.restart()
+        while self.frame < frame and self.step():
+            pass
+        return self.frame
+
+    def run(self):
+        # Plays to the end and returns the scores; agents still running when a
+        # cut-short recording stops get the last frame played
+        while self.step():
+            pass
+        scores = self.game.scores.copy()
+        scores[self.game.agents] = self.frame
+        return scores.tolist()
+
+
+class ReplayNetwork:
+    # Stands in for an agent's network in game.game_loop, answering with the
+    # recorded decisions. game_loop asks every living agent once per frame, so
+    # the n-th call is frame n.
+    def __init__(self, replay, agent):
+        self.replay = replay
+        self.agent = agent
+        self.frame = 0
+
+    def activate(self, inputs):
+        self.frame += 1
+        return [1.0 if self.replay.jumped(self.frame, self.agent) else 0.0]
+
+
+def watch(replay, agents=None, speed=1):
+    # Shows the recorded agents (all of them by default) in the game window
+    from game import game_loop, Player, WINDOW_HEIGHT, PLAYER_SIZE, BLACK
+    if agents is None:
+        agents = range(replay.num_agents)
+    players = [Player(50, WINDOW_HEIGHT - PLAYER_SIZE, BLACK) for _ in agents]
+    networks = [ReplayNetwork(replay, agent) for agent in agents]
+    return game_loop(False, players, neural_networks=networks, course=replay.course(), speed=speed)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Inspect, check or watch a recorded episode')
+    parser.add_argument('replay')
+    parser.add_argument('--check', action='store_true', help='play the replay headless and compare with the recorded scores')
+    parser.add_argument('--seek', type=int, default=None, help='print the state of the game after this frame')
+    parser.add_argument('--watch', action='store_true', help='play the replay in the game window')
+    parser.add_argument('--agents', type=int, nargs='+', default=None, help='with --watch, only these agents (default: all)')
+    parser.add_argument('--best', action='store_true', help='with --watch, only the agent with the best recorded score')
+    parser.add_argument('--speed', type=int, default=1, help='with --watch, starting speed (0 is as fast as possible)')
+    args = parser.parse_args()
+
+    replay = Replay.load(args.replay)
+    print("{0}: course seed {1}, {2} agents, {3} frames{4}".format(
+        os.path.basename(args.replay), replay.seed, replay.num_agents, replay.num_frames,
+        "" if replay.scores is not None else " (cut short)"))
+    if replay.scores is not None:
+        best = max(range(replay.num_agents), key=lambda i: replay.scores[i])
+        print("Best agent: {0} (id {1}) scored {2}".format(best, replay.agent_ids[best], replay.scores[best]))
+
+    if args.seek is not None:
+        player = ReplayPlayer(replay)
+        player.seek(args.seek)
+        game = player.game
+        print("After frame {0}: {1} agents running, next obstacle {2}".format(player.frame, len(game.agents), game.next_obstacle))
+
+    if args.check:
+        scores = ReplayPlayer(replay).run()
+        if replay.scores is None:
+            print("No recorded scores to check against; played back {0} frames".format(max(scores, default=0)))
+        elif scores == replay.scores:
+            print("Playback matches the recorded scores")
+        else:
+            mismatches = [i for i in range(replay.num_agents) if scores[i] != replay.scores[i]]
+            print("Playback differs for {0} agents, e.g. agent {1}: {2} != {3}".format(
+                len(mismatches), mismatches[0], scores[mismatches[0]], replay.scores[mismatches[0]]))
+            raise SystemExit(1)
+
+    if args.watch:
+        agents = args.agents
+        if args.best and replay.scores is not None:
+            agents = [max(range(replay.num_agents), key=lambda i: replay.scores[i])]
+        watch(replay, agents, args.speed)
@@ -0,0 +1,115 @@
+# shared_eval.py
+# ShardedEvaluator without pickling genomes. The coordinator compiles the whole
+# generation into PopulationNetwork's padded arrays once and copies them into
+# a shared memory block, next to a buffer for the scores. A task is then just
+# the block's layout, a range of agents and the course seed: each worker maps
+# the block, plays its range on views of the arrays and writes the scores
+# back in place. The course itself is rebuilt from its seed in the worker
+# (see parallel.shared_course), which is cheaper than copying it.
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+from population import run_population
+from fast_forward import run_fast_forward
+from batch_nn import PopulationNetwork
+from parallel import ShardedEvaluator, shared_course
+from profiling import Profiler, NULL_PROFILER
+
+NETWORK_ARRAYS = ("sources", "weights", "biases", "responses", "outputs", "num_steps")
+ALIGNMENT = 64
+
+
+class SharedArena:
+    # One shared memory block that arrays are laid out in, replaced by a
+    # bigger one when a generation doesn't fit
+    def __init__(self):
+        self.block = None
+
+    def store(self, arrays):
+        # arrays: (name, array) pairs. Returns the layout workers need to find
+        # them, {name: (offset, shape, dtype)}, and views of the copies.
+        layout = {}
+        size = 0
+        for name, array in arrays:
+            layout[name] = (size, array.shape, array.dtype.str)
+            size += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+        if self.block is None or self.block.size < size:
+            # Twice the old size, so networks that keep growing don't need a new block every generation
+            new_size = max(size, 2 * self.block_size(), ALIGNMENT)
+            self.close()
+            self.block = shared_memory.SharedMemory(create=True, size=new_size)
+        views = map_arrays(self.block, layout)
+        for name, array in arrays:
+            views[name][...] = array
+        return (self.block.name, layout), views
+
+    def block_size(self):
+        return self.block.size if self.block is not None else 0
+
+    def close(self):
+        if self.block is not None:
+            self.block.close()
+            self.block.unlink()
+            self.block = None
+
+
+def map_arrays(block, layout):
+    return dict((name, np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=offset))
+                for name, (offset, shape, dtype) in layout.items())
+
+
+# The block each worker has mapped; the coordinator only replaces it when it grows
+attached = {}
+
+
+def attach(name):
+    block = attached.get(name)
+    if block is None:
+        for old in attached.values():
+            old.close()
+        attached.clear()
+        block = attached[name] = shared_memory.SharedMemory(name=name)
+    return block
+
+
+def evaluate_range(layout, num_inputs, start, stop, seed, max_score, fast_forward=False, profile=False):
+    # Plays agents start..stop of the generation in shared memory and writes
+    # their scores there. Returns the worker's timers and counters, if profiling.
+    profiler = Profiler() if profile else NULL_PROFILER
+    name, offsets = layout
+    arrays = map_arrays(attach(name), offsets)
+    network = PopulationNetwork.from_arrays(num_inputs, *(arrays[key][start:stop] for key in NETWORK_ARRAYS))
+    run = run_fast_forward if fast_forward else run_population
+    arrays["scores"][start:stop] = run(network, shared_course(seed), max_score, profiler=profiler)
+    return profiler.snapshot()
+
+
+class SharedEvaluator(ShardedEvaluator):
+    def __init__(self, *args, **kwargs):
+        # Workers have to share the coordinator's resource tracker. One of their
+        # own would unlink the block as soon as that worker exits.
+        resource_tracker.ensure_running()
+        self.arena = SharedArena()
+        ShardedEvaluator.__init__(self, *args, **kwargs)
+
+    def close(self):
+        # The workers first, so none of them still has the block mapped when it's unlinked
+        ShardedEvaluator.close(self)
+        self.arena.close()
+
+    def run_shards(self, genomes, config, seed, max_score):
+        if not genomes:
+            return []
+        t = self.profiler.clock()
+        network = PopulationNetwork.create(genomes, config)
+        self.profiler.add_time("compile", t)
+        arrays = [(key, getattr(network, key)) for key in NETWORK_ARRAYS]
+        arrays.append(("scores", np.zeros(len(genomes), dtype=np.int64)))
+        layout, views = self.arena.store(arrays)
+
+        jobs = []
+        for agents in self.shards(range(len(genomes))):
+            jobs.append(self.pool.apply_async(evaluate_range, (layout, network.num_inputs, agents.start, agents.stop, seed, max_score,
+                                                               self.fast_forward, self.profiler.enabled)))
+        for job in jobs:
+            self.profiler.merge(job.get(timeout=self.timeout))
+        return views["scores"].tolist()
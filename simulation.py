@@ -0,0 +1,184 @@
+# simulation.py
+# Headless version of the game rules in game.py. Nothing in here touches pygame,
+# so it can run without a window and without the frame clock.
+import random
+from array import array
+
+WINDOW_WIDTH = 800
+WINDOW_HEIGHT = 300
+
+PLAYER_SIZE = 30
+OBSTACLE_WIDTH = 20
+OBSTACLE_HEIGHT = 50
+MAX_SCORE_THRESHOLD = 12000  # Adjust this value as needed
+
+PLAYER_X = 50
+GROUND_Y = WINDOW_HEIGHT - PLAYER_SIZE
+JUMP_VELOCITY = -18
+GRAVITY = 1
+OBSTACLE_SPEED = 5
+MIN_SEPARATION = 160
+COURSE_CHUNK_SIZE = 256
+
+
+def obstacle_geometry(prev_x, min_separation, rng=random):
+    x = prev_x + min_separation + rng.randint(0, 100)
+    width = rng.randint(20, 50)
+    height = rng.randint(20, 100)
+    return x, WINDOW_HEIGHT - height, width, height
+
+
+class Course:
+    # Every obstacle of an episode, generated from one seed with the same draws
+    # game.py makes after random.seed(seed). x is where the obstacle sits on
+    # frame 0; on frame t it is at x - OBSTACLE_SPEED * t. Obstacles are made
+    # lazily in chunks, so one Course can be shared by any number of games.
+    def __init__(self, seed=None, min_separation=MIN_SEPARATION, chunk_size=COURSE_CHUNK_SIZE):
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.seed = seed
+        self.min_separation = min_separation
+        self.chunk_size = chunk_size
+        self.rng = random.Random(seed)
+        self.x = array('i')
+        self.width = array('i')
+        self.height = array('i')
+
+    def __len__(self):
+        return len(self.x)
+
+    def extend(self):
+        for _ in range(self.chunk_size):
+            i = len(self.x)
+            # The first three obstacles are spaced from fixed slots, the rest from the one before
+            prev_x = i * (self.min_separation + OBSTACLE_WIDTH) if i < 3 else self.x[-1]
+            x, y, width, height = obstacle_geometry(prev_x, self.min_separation, self.rng)
+            self.x.append(x)
+            self.width.append(width)
+            self.height.append(height)
+
+    def prefill(self, frames):
+        # Make sure every obstacle that can appear within the given number of frames exists
+        # Obstacle i leaving the screen brings in obstacle i + 3
+        while len(self.x) < 3 or self.x[-3] - OBSTACLE_SPEED * frames <= -OBSTACLE_WIDTH:
+            self.extend()
+
+    def obstacle(self, index, frame=0):
+        while index >= len(self.x):
+            self.extend()
+        height = self.height[index]
+        return [self.x[index] - OBSTACLE_SPEED * frame, WINDOW_HEIGHT - height, self.width[index], height]
+
+
+class Agent:
+    def __init__(self):
+        self.score = 0
+        self.alive = True
+        self.y = GROUND_Y
+        self.y_velocity = 0
+
+    def update(self):
+        self.y_velocity += GRAVITY
+        self.y += self.y_velocity
+        if self.y > GROUND_Y:
+            self.y = GROUND_Y
+            self.y_velocity = 0
+
+    def jump(self):
+        if self.y == GROUND_Y:
+            self.y_velocity = JUMP_VELOCITY
+
+    def collides(self, obstacle):
+        x, y, width, height = obstacle
+        return (PLAYER_X < x + width and x < PLAYER_X + PLAYER_SIZE and
+                self.y < y + height and y < self.y + PLAYER_SIZE)
+
+
+def get_obstacle_info(obstacles, first):
+    # obstacles is a ring buffer: a new obstacle always goes into the slot of the
+    # one that just left, so reading the ring from the slot of the leftmost
+    # obstacle gives them in x order without sorting
+    obstacle_info = []
+
+    for k in range(len(obstacles)):
+        x, y, width, height = obstacles[(first + k) % len(obstacles)]
+        distance = x - PLAYER_X - PLAYER_SIZE
+        obstacle_info.append((distance, width, height))
+
+    return obstacle_info
+
+
+def obstacle_inputs(closest_obstacles):
+    # The six inputs every agent shares; only on_ground is per agent
+    return [info[0] for info in closest_obstacles] + \
+           [info[2] for info in closest_obstacles]
+
+
+class HeadlessGame:
+    # Same frame order as game.game_loop: score, physics, collisions,
+    # obstacle replacement, then the network decides the next jump.
+    def __init__(self, num_agents, course=None, max_score=MAX_SCORE_THRESHOLD):
+        self.course = course if course is not None else Course()
+        self.max_score = max_score
+        self.obstacles = [self.course.obstacle(i) for i in range(3)]
+        self.next_obstacle = 3
+        self.agents = [Agent() for _ in range(num_agents)]
+        # Indices of the agents still running; a dead agent keeps the score it died with
+        self.alive_agents = list(range(num_agents))
+        self.score = 0
+        self.game_over = num_agents == 0
+
+    def kill(self, agent):
+        agent.alive = False
+        agent.score = self.score
+
+    def step(self, neural_networks=None):
+        self.score += 1
+        if self.score > self.max_score:
+            for i in self.alive_agents:
+                self.kill(self.agents[i])
+            self.alive_agents = []
+            self.game_over = True
+            return
+
+        for i in self.alive_agents:
+            self.agents[i].update()
+
+        for obstacle in self.obstacles:
+            obstacle[0] -= OBSTACLE_SPEED
+
+        survivors = []
+        for i in self.alive_agents:
+            agent = self.agents[i]
+            if any(agent.collides(obstacle) for obstacle in self.obstacles):
+                self.kill(agent)
+            else:
+                survivors.append(i)
+        self.alive_agents = survivors
+        self.game_over = not survivors
+
+        # Replace obstacles that have left the screen
+        for i, obstacle in enumerate(self.obstacles):
+            if obstacle[0] <= -OBSTACLE_WIDTH:
+                self.obstacles[i] = self.course.obstacle(self.next_obstacle, self.score)
+                self.next_obstacle += 1
+
+        if neural_networks is not None:
+            # Obstacle i of the course always sits in slot i % 3
+            shared_inputs = obstacle_inputs(get_obstacle_info(self.obstacles, self.next_obstacle % 3))
+            for i in self.alive_agents:
+                agent = self.agents[i]
+                output = neural_networks[i].activate(shared_inputs + [int(agent.y == GROUND_Y)])
+                if output[0] > 0.5:
+                    agent.jump()
+
+    @property
+    def scores(self):
+        return [agent.score for agent in self.agents]
+
+
+def run_headless(neural_networks, course=None, max_score=MAX_SCORE_THRESHOLD):
+    game = HeadlessGame(len(neural_networks), course, max_score)
+    while not game.game_over:
+        game.step(neural_networks)
+    return game.scores
@@ -0,0 +1,248 @@
+# species.py
+# neat's DefaultSpeciesSet with the genome distances computed in NumPy.
+# Speciation compares every genome with every species representative, and
+# neat does that one gene at a time in Python, which is the slowest part of a
+# generation once the population runs into the thousands. Here every gene of
+# the population sits in flat arrays (owner, key, values), so the distances
+# from one representative to the whole population are a few array operations.
+# Distances are DefaultGenome.distance up to float rounding, and speciate()
+# makes the same choices in the same order as neat's.
+#
+#   config.species_set_type = VectorSpeciesSet
+import numpy as np
+from neat.species import DefaultSpeciesSet, Species
+
+
+class GenomeArrays:
+    def __init__(self, population, genome_config):
+        self.genome_config = genome_config
+        self.keys = list(population)
+        self.index = dict((key, i) for i, key in enumerate(self.keys))
+        # Every distinct node and connection key gets a column; genes of the
+        # population are rows pointing at their genome and column
+        self.node_columns = {}
+        self.connection_columns = {}
+        self.function_codes = {}
+        owners, columns, biases, responses, activations, aggregations = [], [], [], [], [], []
+        connection_owners, connection_columns, weights, enabled = [], [], [], []
+        for i, key in enumerate(self.keys):
+            genome = population[key]
+            for node_key, node in genome.nodes.items():
+                owners.append(i)
+                columns.append(self.node_columns.setdefault(node_key, len(self.node_columns)))
+                biases.append(node.bias)
+                responses.append(node.response)
+                activations.append(self.function_code(node.activation))
+                aggregations.append(self.function_code(node.aggregation))
+            for connection_key, connection in genome.connections.items():
+                connection_owners.append(i)
+                connection_columns.append(self.connection_columns.setdefault(connection_key, len(self.connection_columns)))
+                weights.append(connection.weight)
+                enabled.append(connection.enabled)
+
+        num_genomes = len(self.keys)
+        self.node_owners = np.array(owners, dtype=np.int64)
+        self.node_keys = np.array(columns, dtype=np.int64)
+        self.biases = np.array(biases, dtype=float)
+        self.responses = np.array(responses, dtype=float)
+        self.activations = np.array(activations, dtype=np.int64)
+        self.aggregations = np.array(aggregations, dtype=np.int64)
+        self.num_nodes = np.bincount(self.node_owners, minlength=num_genomes)
+        self.connection_owners = np.array(connection_owners, dtype=np.int64)
+        self.connection_keys = np.array(connection_columns, dtype=np.int64)
+        self.weights = np.array(weights, dtype=float)
+        self.enabled = np.array(enabled, dtype=bool)
+        self.num_connections = np.bincount(self.connection_owners, minlength=num_genomes)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def function_code(self, name):
+        return self.function_codes.setdefault(name, len(self.function_codes))
+
+    def distances(self, genome):
+        # genome.distance(other) for every other genome of the population, in
+        # the order of self.keys. genome doesn't have to be in the population.
+        config = self.genome_config
+
+        # The genome's own genes, spread over the columns of the population
+        has = np.zeros(len(self.node_columns), dtype=bool)
+        bias = np.zeros(len(self.node_columns))
+        response = np.zeros(len(self.node_columns))
+        activation = np.full(len(self.node_columns), -1, dtype=np.int64)
+        aggregation = np.full(len(self.node_columns), -1, dtype=np.int64)
+        for node_key, node in genome.nodes.items():
+            column = self.node_columns.get(node_key)
+            if column is not None:
+                has[column] = True
+                bias[column] = node.bias
+                response[column] = node.response
+                activation[column] = self.function_codes.get(node.activation, -2)
+                aggregation[column] = self.function_codes.get(node.aggregation, -2)
+        # Same arithmetic per gene as DefaultNodeGene.distance
+        matched = has[self.node_keys]
+        keys = self.node_keys[matched]
+        d = np.abs(self.biases[matched] - bias[keys]) + np.abs(self.responses[matched] - response[keys])
+        d += self.activations[matched] != activation[keys]
+        d += self.aggregations[matched] != aggregation[keys]
+        d *= config.compatibility_weight_coefficient
+        node_distance = self.gene_distance(len(genome.nodes), self.num_nodes, self.node_owners[matched], d)
+
+        has = np.zeros(len(self.connection_columns), dtype=bool)
+        weight = np.zeros(len(self.connection_columns))
+        enabled = np.zeros(len(self.connection_columns), dtype=bool)
+        for connection_key, connection in genome.connections.items():
+            column = self.connection_columns.get(connection_key)
+            if column is not None:
+                has[column] = True
+                weight[column] = connection.weight
+                enabled[column] = connection.enabled
+        # Same arithmetic per gene as DefaultConnectionGene.distance
+        matched = has[self.connection_keys]
+        keys = self.connection_keys[matched]
+        d = np.abs(self.weights[matched] - weight[keys])
+        d += self.enabled[matched] != enabled[keys]
+        d *= config.compatibility_weight_coefficient
+        connection_distance = self.gene_distance(len(genome.connections), self.num_connections,
+                                                 self.connection_owners[matched], d)
+        return node_distance + connection_distance
+
+    def gene_distance(self, num_genes, population_genes, owners, d):
+        # The node or connection half of DefaultGenome.distance: homologous genes
+        # add their distance, every gene only one side has counts as disjoint
+        num_genomes = len(self.keys)
+        homologous = np.bincount(owners, weights=d, minlength=num_genomes)
+        matched = np.bincount(owners, minlength=num_genomes)
+        disjoint = num_genes + population_genes - 2 * matched
+        most = np.maximum(num_genes, population_genes)
+        distance = homologous + self.genome_config.compatibility_disjoint_coefficient * disjoint
+        return np.divide(distance, most, out=np.zeros(num_genomes), where=most > 0)
+
+
+class VectorSpeciesSet(DefaultSpeciesSet):
+    def speciate(self, config, population, generation):
+        # DefaultSpeciesSet.speciate, step for step, with each representative's
+        # distances to the whole population computed at once
+        compatibility_threshold = self.species_set_config.compatibility_threshold
+        genomes = GenomeArrays(population, config.genome_config)
+        compared = []
+
+        # Find the best representatives for each existing species. Built the
+        # way neat builds it: set() of a dict is sized differently from set()
+        # of an iterator, and pop() below would hand out genomes in another order.
+        unspeciated = set(iter(population.keys()))
+        new_representatives = {}
+        new_members = {}
+        for sid, s in self.species.items():
+            candidates = np.fromiter((genomes.index[gid] for gid in unspeciated), dtype=np.int64, count=len(unspeciated))
+            distances = genomes.distances(s.representative)[candidates]
+            compared.append(distances)
+            # The new representative is the genome closest to the current representative.
+            new_rid = genomes.keys[candidates[np.argmin(distances)]]
+            new_representatives[sid] = new_rid
+            new_members[sid] = [new_rid]
+            unspeciated.remove(new_rid)
+
+        # Partition population into species based on genetic similarity. Row k
+        # of rows holds the distances from representative k to every genome.
+        sids = list(new_representatives)
+        rows = np.empty((max(16, 2 * len(sids)), len(genomes)))
+        for k, rid in enumerate(new_representatives.values()):
+            rows[k] = genomes.distances(population[rid])
+        while unspeciated:
+            gid = unspeciated.pop()
+            distances = rows[:len(sids), genomes.index[gid]]
+            compared.append(distances.copy())
+
+            # Find the species with the most similar representative.
+            close = distances < compatibility_threshold
+            if close.any():
+                sid = sids[int(np.argmin(np.where(close, distances, np.inf)))]
+                new_members[sid].append(gid)
+            else:
+                # No species is similar enough, create a new species, using
+                # this genome as its representative.
+                sid = next(self.indexer)
+                new_representatives[sid] = gid
+                new_members[sid] = [gid]
+                if len(sids) == len(rows):
+                    rows = np.concatenate([rows, np.empty_like(rows)])
+                rows[len(sids)] = genomes.distances(population[gid])
+                sids.append(sid)
+
+        # Update species collection based on new speciation.
+        self.genome_to_species = {}
+        for sid, rid in new_representatives.items():
+            s = self.species.get(sid)
+            if s is None:
+                s = Species(sid, generation)
+                self.species[sid] = s
+
+            members = new_members[sid]
+            for gid in members:
+                self.genome_to_species[gid] = sid
+
+            member_dict = dict((gid, population[gid]) for gid in members)
+            s.update(population[rid], member_dict)
+
+        # neat reports these over its distance cache; these are the same comparisons
+        compared = np.concatenate(compared) if compared else np.zeros(1)
+        self.reporters.info(
+            'Mean genetic distance {0:.3f}, standard deviation {1:.3f}'.format(compared.mean(), compared.std()))
+
+
+if __name__ == '__main__':
+    # Equivalence check: whole runs with VectorSpeciesSet and DefaultSpeciesSet
+    # from the same seed have to put every genome in the same species, every
+    # generation. Speciation doesn't draw random numbers and the fitness only
+    # depends on the genome key, so the two runs stay in step while they agree.
+    import os
+    import random
+    import argparse
+    import neat
+
+    class SpeciesRecorder(neat.reporting.BaseReporter):
+        def __init__(self):
+            self.history = []
+
+        def post_evaluate(self, config, population, species, best_genome):
+            self.history.append(dict(species.genome_to_species))
+
+    def seeded_fitness(genomes, config):
+        for genome_id, genome in genomes:
+            genome.fitness = random.Random(genome_id).random()
+
+    parser = argparse.ArgumentParser(description="Compare VectorSpeciesSet with neat's DefaultSpeciesSet over whole runs")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--pop-size', type=int, default=300)
+    parser.add_argument('--generations', type=int, default=15)
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[1.0, 2.0, 3.0])
+    parser.add_argument('--config', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config-feedforward.txt'))
+    args = parser.parse_args()
+
+    mismatches = 0
+    for threshold in args.thresholds:
+        histories = []
+        for species_set_type in (DefaultSpeciesSet, VectorSpeciesSet):
+            config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                                 neat.DefaultSpeciesSet, neat.DefaultStagnation,
+                                 args.config)
+            config.species_set_type = species_set_type
+            config.pop_size = args.pop_size
+            config.species_set_config.compatibility_threshold = threshold
+            config.no_fitness_termination = True
+            random.seed(args.seed)
+            pop = neat.Population(config)
+            recorder = SpeciesRecorder()
+            pop.add_reporter(recorder)
+            pop.run(seeded_fitness, args.generations)
+            histories.append(recorder.history)
+        expected, history = histories
+        generation = next((g for g in range(len(expected)) if history[g] != expected[g]), None)
+        if generation is None:
+            print("Threshold {0:g}: same species in all {1} generations".format(threshold, len(expected)))
+        else:
+            mismatches += 1
+            print("Mismatch: threshold {0:g}: species differ from generation {1}".format(threshold, generation))
+    if mismatches:
+        raise SystemExit(1)
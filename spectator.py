@@ -0,0 +1,98 @@
+# spectator.py
+# Watch training live without slowing it down. Training stays headless; a
+# separate viewer process opens the game window and plays the latest best
+# networks it was sent, with game.py's sprites, node panel and HUD.
+#
+# Every generation the trainer sends a snapshot (the generation, its best
+# fitness, the seed of the course it was evaluated on, and the networks of the
+# best agents in the compact file format, a few hundred bytes each) through a
+# small bounded queue. Sending never waits: when the queue is full the
+# snapshot is dropped. The viewer plays one episode at a time and then picks
+# the newest snapshot waiting, skipping the ones in between, or replays the
+# last one.
+import queue
+import random
+import multiprocessing
+
+SNAPSHOT_QUEUE_SIZE = 2
+WAIT_INTERVAL = 0.1  # How often the waiting viewer looks for a snapshot and window events, in seconds
+
+
+class Spectator:
+    def __init__(self):
+        # A fresh interpreter for the viewer, so pygame never shares a process
+        # (or forked threads) with training
+        context = multiprocessing.get_context('spawn')
+        self.channel = context.Queue(SNAPSHOT_QUEUE_SIZE)
+        self.process = context.Process(target=run_viewer, args=(self.channel,), daemon=True)
+        self.process.start()
+        self.sent = 0
+        self.dropped = 0
+
+    def send(self, generation, fitness, networks, course_seed=None):
+        # networks: netformat.CompactNetwork of each agent to show, best first.
+        # Returns False if the snapshot was dropped.
+        if not self.process.is_alive():
+            self.dropped += 1
+            return False
+        try:
+            self.channel.put_nowait((generation, fitness, course_seed, [network.dumps() for network in networks]))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.sent += 1
+        return True
+
+    def close(self):
+        # Snapshots the viewer never read must not hold up the trainer's exit
+        self.channel.cancel_join_thread()
+        self.channel.close()
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+
+
+def newest(channel, timeout=None):
+    # The newest snapshot in the channel, dropping older ones; None if there
+    # is none (after waiting up to timeout for the first)
+    try:
+        snapshot = channel.get(timeout=timeout) if timeout else channel.get_nowait()
+    except queue.Empty:
+        return None
+    while True:
+        try:
+            snapshot = channel.get_nowait()
+        except queue.Empty:
+            return snapshot
+
+
+def run_viewer(channel):
+    import pygame
+    from game import game_loop, init_display, draw_text, Player, WINDOW_WIDTH, WINDOW_HEIGHT, PLAYER_SIZE, BLACK, WHITE
+    from netformat import CompactNetwork
+    from simulation import Course
+
+    screen = init_display()
+    pygame.display.set_caption("Dinosaur Game - waiting for the first generation")
+    screen.fill(WHITE)
+    draw_text("Waiting for the first generation", 36, WINDOW_WIDTH // 2 - 200, WINDOW_HEIGHT // 2 - 50)
+    pygame.display.flip()
+    snapshot = None
+    while snapshot is None:
+        if any(event.type == pygame.QUIT for event in pygame.event.get()):
+            return
+        snapshot = newest(channel, WAIT_INTERVAL)
+
+    colors = [BLACK]
+    while True:
+        generation, fitness, course_seed, blobs = snapshot
+        networks = [CompactNetwork.loads(blob) for blob in blobs]
+        while len(colors) < len(networks):
+            colors.append((random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)))
+        players = [Player(50, WINDOW_HEIGHT - PLAYER_SIZE, color) for color in colors[:len(networks)]]
+        pygame.display.set_caption("Dinosaur Game - generation {0}, best fitness {1:g}".format(generation, fitness))
+        course = Course(course_seed) if course_seed is not None else None
+        # Closing the window ends the process from inside game_loop
+        game_loop(False, players, neural_networks=networks, current_best_score=fitness, auto_start=True,
+                  generation=generation, course=course)
+        snapshot = newest(channel) or snapshot
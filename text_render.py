@@ -0,0 +1,65 @@
+# text_render.py
+# Shared text drawing for the game windows. Fonts are loaded once per size and
+# rendered strings are kept in a small LRU cache, so drawing the same text
+# every frame costs a blit instead of a font load and a render.
+from collections import OrderedDict
+import pygame
+
+BLACK = (0, 0, 0)
+MAX_CACHED_SURFACES = 256
+
+
+class TextRenderer:
+    def __init__(self, max_surfaces=MAX_CACHED_SURFACES):
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+        self.max_surfaces = max_surfaces
+
+    def font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            font = pygame.font.Font(None, size)
+            self.fonts[size] = font
+        return font
+
+    def render(self, text, size, color=BLACK):
+        key = (text, size, color)
+        text_surface = self.surfaces.get(key)
+        if text_surface is None:
+            text_surface = self.font(size).render(text, True, color)
+            self.surfaces[key] = text_surface
+            if len(self.surfaces) > self.max_surfaces:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(key)
+        return text_surface
+
+    def draw(self, screen, text, size, x, y, color=BLACK):
+        return screen.blit(self.render(text, size, color), (x, y))
+
+
+class HudField:
+    # Text that changes while the game runs (score, network values). It keeps
+    # its own surface and only renders again when the formatted text changes,
+    # so values that change every frame don't push everything out of the cache.
+    def __init__(self, renderer, fmt, size, color=BLACK):
+        self.renderer = renderer
+        self.fmt = fmt
+        self.size = size
+        self.color = color
+        self.text = None
+        self.surface = None
+        self.rect = None
+
+    def draw(self, screen, value, x, y, background=None):
+        # With a background the previous text is erased first. Returns the area
+        # that changed, for pygame.display.update
+        text = self.fmt.format(value)
+        if text != self.text:
+            self.text = text
+            self.surface = self.renderer.font(self.size).render(text, True, self.color)
+        old_rect = self.rect
+        if background is not None and old_rect is not None:
+            screen.blit(background, old_rect, old_rect)
+        self.rect = screen.blit(self.surface, (x, y))
+        return self.rect.union(old_rect) if old_rect is not None else self.rect
@@ -0,0 +1,156 @@
+# vec_env.py
+# Many independent games at once, one agent each, for optimizers other than
+# NEAT. Every game has its own course and clock, and all of them live in NumPy
+# arrays, so a step of every game is a handful of array operations:
+#
+#   env = VecEnv(1000)
+#   obs = env.reset(seeds)
+#   while not env.dones.all():
+#       obs, rewards, dones = env.step(policy(obs))
+#
+# The rules and the 7 observations are the ones of game.py. reset() plays the
+# first frame and each step() is the decision made at the end of a frame plus
+# the next frame, which is exactly when game_loop asks the network. So a policy
+# ends with env.scores equal to its game score; it gets a reward of 1 per step,
+# which adds up to the score minus the frame reset() played.
+import numpy as np
+from simulation import PLAYER_X, PLAYER_SIZE, GROUND_Y, JUMP_VELOCITY, GRAVITY, OBSTACLE_SPEED, OBSTACLE_WIDTH
+from simulation import WINDOW_HEIGHT, MAX_SCORE_THRESHOLD, MIN_SEPARATION
+from simulation import Course
+from population import NUM_INPUTS
+
+# Courses are generated this many obstacles at a time. Most games end early,
+# so a small chunk keeps reset() cheap.
+COURSE_CHUNK_SIZE = 16
+
+
+class VecEnv:
+    def __init__(self, num_envs, max_score=MAX_SCORE_THRESHOLD, min_separation=MIN_SEPARATION):
+        self.num_envs = num_envs
+        self.max_score = max_score
+        self.min_separation = min_separation
+        self.courses = [None] * num_envs
+        # Obstacles of every course, one row per game, padded to the longest course
+        self.course_x = np.zeros((num_envs, 0), dtype=np.int64)
+        self.course_width = np.zeros((num_envs, 0), dtype=np.int64)
+        self.course_height = np.zeros((num_envs, 0), dtype=np.int64)
+        # The three obstacles on screen, as a ring: the leftmost is in slot next_obstacle % 3
+        self.x = np.zeros((num_envs, 3), dtype=np.int64)
+        self.width = np.zeros((num_envs, 3), dtype=np.int64)
+        self.height = np.zeros((num_envs, 3), dtype=np.int64)
+        self.next_obstacle = np.full(num_envs, 3, dtype=np.int64)
+        self.y = np.full(num_envs, GROUND_Y, dtype=np.int64)
+        self.y_velocity = np.zeros(num_envs, dtype=np.int64)
+        self.scores = np.zeros(num_envs, dtype=np.int64)
+        self.dones = np.ones(num_envs, dtype=bool)
+        self.envs = np.arange(num_envs)
+
+    def load_courses(self, envs, length):
+        # Copies the courses of the given envs into the padded arrays, first
+        # making them at least length obstacles long. Growing them copies the
+        # course of every game still running; finished ones are copied when reset.
+        capacity = self.course_x.shape[1]
+        if length > capacity:
+            capacity = max(length, 2 * capacity)
+            pad = ((0, 0), (0, capacity - self.course_x.shape[1]))
+            self.course_x = np.pad(self.course_x, pad)
+            self.course_width = np.pad(self.course_width, pad)
+            self.course_height = np.pad(self.course_height, pad)
+            envs = np.union1d(envs, self.envs[~self.dones])
+        for e in envs.tolist():
+            course = self.courses[e]
+            while len(course) < capacity:
+                course.extend()
+            self.course_x[e] = np.frombuffer(course.x, dtype=np.intc, count=capacity)
+            self.course_width[e] = np.frombuffer(course.width, dtype=np.intc, count=capacity)
+            self.course_height[e] = np.frombuffer(course.height, dtype=np.intc, count=capacity)
+
+    def reset(self, seeds=None, envs=None):
+        # Starts new games in the given envs (all by default) on the given course
+        # seeds (random ones by default) and plays their first frame
+        envs = self.envs if envs is None else np.asarray(envs, dtype=np.int64)
+        if seeds is None:
+            seeds = [None] * len(envs)
+        if len(seeds) != len(envs):
+            raise ValueError("Expected {0} seeds, got {1}".format(len(envs), len(seeds)))
+        for e, seed in zip(envs.tolist(), seeds):
+            self.courses[e] = Course(seed, self.min_separation, COURSE_CHUNK_SIZE)
+        self.load_courses(envs, COURSE_CHUNK_SIZE)
+
+        self.x[envs] = self.course_x[envs, :3]
+        self.width[envs] = self.course_width[envs, :3]
+        self.height[envs] = self.course_height[envs, :3]
+        self.next_obstacle[envs] = 3
+        self.y[envs] = GROUND_Y
+        self.y_velocity[envs] = 0
+        self.scores[envs] = 0
+        self.dones[envs] = False
+        self.advance(envs)
+        return self.observations()
+
+    def step(self, actions):
+        # actions: anything truthy jumps, one per env. Finished envs ignore
+        # theirs, get a reward of 0 and stay done until they are reset.
+        running = self.envs[~self.dones]
+        jumps = np.asarray(actions, dtype=bool)[running] & (self.y[running] == GROUND_Y)
+        self.y_velocity[running[jumps]] = JUMP_VELOCITY
+        self.advance(running)
+        rewards = np.zeros(self.num_envs)
+        rewards[running] = 1.0
+        return self.observations(), rewards, self.dones.copy()
+
+    def advance(self, envs):
+        # One frame of the given envs, in the order of PopulationGame.advance
+        self.scores[envs] += 1
+        over = self.scores[envs] > self.max_score
+        self.dones[envs[over]] = True
+        envs = envs[~over]
+
+        y_velocity = self.y_velocity[envs] + GRAVITY
+        y = self.y[envs] + y_velocity
+        landed = y > GROUND_Y
+        y[landed] = GROUND_Y
+        y_velocity[landed] = 0
+        self.y[envs] = y
+        self.y_velocity[envs] = y_velocity
+
+        x = self.x[envs] - OBSTACLE_SPEED
+        self.x[envs] = x
+        width = self.width[envs]
+        height = self.height[envs]
+        top = WINDOW_HEIGHT - height
+        hit = ((PLAYER_X < x + width) & (x < PLAYER_X + PLAYER_SIZE) &
+               (y[:, None] < top + height) & (top < y[:, None] + PLAYER_SIZE)).any(axis=1)
+        self.dones[envs[hit]] = True
+
+        # Obstacles are at least MIN_SEPARATION apart, so only the leftmost one can have left
+        slot = self.next_obstacle[envs] % 3
+        gone = x[np.arange(len(envs)), slot] <= -OBSTACLE_WIDTH
+        if gone.any():
+            envs, slot = envs[gone], slot[gone]
+            index = self.next_obstacle[envs]
+            if index.max() >= self.course_x.shape[1]:
+                self.load_courses(envs, index.max() + 1)
+            self.x[envs, slot] = self.course_x[envs, index] - OBSTACLE_SPEED * self.scores[envs]
+            self.width[envs, slot] = self.course_width[envs, index]
+            self.height[envs, slot] = self.course_height[envs, index]
+            self.next_obstacle[envs] += 1
+
+    def observations(self):
+        # The inputs game.py gives the network: distance to the three obstacles
+        # and their heights, left to right, then whether the agent is on the ground
+        order = (self.next_obstacle[:, None] + np.arange(3)) % 3
+        observations = np.empty((self.num_envs, NUM_INPUTS))
+        observations[:, 0:3] = np.take_along_axis(self.x, order, axis=1) - PLAYER_X - PLAYER_SIZE
+        observations[:, 3:6] = np.take_along_axis(self.height, order, axis=1)
+        observations[:, 6] = self.y == GROUND_Y
+        return observations
+
+
+def rollout(policy, seeds, max_score=MAX_SCORE_THRESHOLD):
+    # Plays one game per seed with policy(observations) -> actions and returns the scores
+    env = VecEnv(len(seeds), max_score)
+    observations = env.reset(seeds)
+    while not env.dones.all():
+        observations, rewards, dones = env.step(policy(observations))
+    return env.scores.tolist()